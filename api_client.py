@@ -1,8 +1,68 @@
 import base64
+import json
 from datetime import datetime
+import socket
+import threading
+import time
+from urllib.parse import quote
 import cv2
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+try:
+    import pybase64
+    HAVE_PYBASE64 = True
+except ImportError:
+    HAVE_PYBASE64 = False
+
+
+try:
+    import orjson
+    HAVE_ORJSON = True
+except ImportError:
+    HAVE_ORJSON = False
+
+
+def dumps_json(payload):
+    """Serialize a payload to JSON bytes, using orjson when installed"""
+    if HAVE_ORJSON:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode('utf-8')
+
+
+def b64encode_str(data):
+    """Base64-encode bytes to str, using SIMD pybase64 when installed"""
+    if HAVE_PYBASE64:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode('utf-8')
+
+
+_iso_cache = [-1, '']
+
+
+def utc_now_iso():
+    """UTC ISO-8601 timestamp, formatted at most once per second"""
+    now = int(time.time())
+    if now != _iso_cache[0]:
+        _iso_cache[1] = datetime.utcfromtimestamp(now).isoformat()
+        _iso_cache[0] = now
+    return _iso_cache[1]
+
+
+class TunedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose sockets skip Nagle delays and get a larger send buffer"""
+
+    socket_options = HTTPConnection.default_socket_options + [
+        (socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20),
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    ]
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
 
 
 class APIClient:
@@ -12,18 +72,47 @@ class APIClient:
         self.device_name = device_name
         self.headers = {'Content-Type': 'application/json'}
 
+        # One pooled session so every call reuses a keep-alive TCP/TLS connection
+        self.session = requests.Session()
+        adapter = TunedHTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=16,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._call_url = f"{self.base_url}/api/notifications/call"
+        self._upload_url = f"{self.base_url}/api/images/upload-captured"
+        self._notify_url = f"{self.base_url}/api/notifications/device"
+        self._door_url = f"{self.base_url}/api/door/state/device/{self.device_id}"
+
+        # Send captures as a raw JPEG body until the backend says it only
+        # understands the base64 JSON upload
+        self.raw_uploads = True
+
+        # Pay the TCP/TLS handshake now rather than on the first doorbell event
+        threading.Thread(target=self._warm_connection, daemon=True).start()
+
+    def _warm_connection(self):
+        """Open a pooled keep-alive connection before the first real request"""
+        try:
+            self.session.head(self.base_url, timeout=3)
+        except Exception as e:
+            print(f"[WARN] Connection warm-up failed: {e}")
+
     def initiate_call(self):
         try:
             payload = {
                 'deviceId': self.device_id,
                 'deviceName': self.device_name,
-                'timestamp': datetime.utcnow().isoformat(),
+                'timestamp': utc_now_iso(),
                 'callType': 'doorbell_button'
             }
 
-            r = requests.post(
-                f"{self.base_url}/api/notifications/call",
-                json=payload,
+            r = self.session.post(
+                self._call_url,
+                data=dumps_json(payload),
                 headers=self.headers,
             )
 
@@ -36,21 +125,42 @@ class APIClient:
     def upload_captured_face(self, image_bytes, filename,
                              person_name="Unknown", status="unrecognized"):
         try:
-            payload = {
-                'deviceId': self.device_id,
-                'imageData': base64.b64encode(image_bytes).decode(),
-                'filename': filename,
-                'personName': person_name,
-                'status': status,
-                'bucket': 'captured-faces',
-                'timestamp': datetime.utcnow().isoformat()
-            }
-
-            r = requests.post(
-                f"{self.base_url}/api/images/upload-captured",
-                json=payload,
-                headers=self.headers,
-            )
+            r = None
+            if self.raw_uploads:
+                r = self.session.post(
+                    self._upload_url,
+                    data=image_bytes,
+                    headers={
+                        'Content-Type': 'image/jpeg',
+                        'X-Device-Id': self.device_id,
+                        'X-Filename': quote(filename),
+                        'X-Person-Name': quote(person_name),
+                        'X-Status': status,
+                        'X-Bucket': 'captured-faces',
+                        'X-Timestamp': utc_now_iso()
+                    },
+                )
+                if r.status_code in (400, 415):
+                    print("[WARN] Raw image upload rejected, using base64 JSON upload")
+                    self.raw_uploads = False
+                    r = None
+
+            if r is None:
+                payload = {
+                    'deviceId': self.device_id,
+                    'imageData': b64encode_str(image_bytes),
+                    'filename': filename,
+                    'personName': person_name,
+                    'status': status,
+                    'bucket': 'captured-faces',
+                    'timestamp': utc_now_iso()
+                }
+
+                r = self.session.post(
+                    self._upload_url,
+                    data=dumps_json(payload),
+                    headers=self.headers,
+                )
 
             if r.status_code == 200:
                 url = r.json().get("url")
@@ -72,15 +182,15 @@ class APIClient:
                 'deviceId': self.device_id,
                 'status': status,
                 'imageUrl': image_url,
-                'timestamp': datetime.utcnow().isoformat(),
+                'timestamp': utc_now_iso(),
                 'confidence': confidence,
                 'personName': person_name
             }
 
-            response = requests.post(
-                f"{self.base_url}/api/notifications/device",
+            response = self.session.post(
+                self._notify_url,
                 headers=self.headers,
-                json=payload,
+                data=dumps_json(payload),
             )
 
             if response.status_code == 200:
@@ -94,6 +204,18 @@ class APIClient:
             print(f"[ERROR] Failed to send notification: {e}")
             return False
 
+    def get_door_state(self):
+        """Fetch the door state from backend, or None if it can't be read"""
+        try:
+            r = self.session.get(self._door_url, timeout=3)
+            if r.status_code == 200:
+                return r.json().get('state', 'locked')
+            print(f"[WARN] Door state fetch failed: {r.status_code}")
+        except Exception as e:
+            print("[ERROR] Door state fetch failed:", e)
+
+        return None
+
 # Global instance
 api_client = None
 
@@ -1,18 +1,31 @@
 from flask import Flask, Response, jsonify
 import threading
-import time
-import cv2
 import numpy as np
-from camera import Camera
+from camera import Camera, draw_face_annotations
+from jpeg_codec import CAPTURE_JPEG_QUALITY, STREAM_JPEG_QUALITY, encode_jpeg, mjpeg_part
 from recognizer import Recognizer
 
+try:
+    from waitress import serve
+    HAVE_WAITRESS = True
+except ImportError:
+    HAVE_WAITRESS = False
+
 app = Flask(__name__)
 
 # Global variables for local streaming
 camera = None
 recognizer = None
 latest_frame = None
-frame_lock = threading.Lock()
+# Low-quality preview JPEG of latest_frame as an MJPEG part, shared by every viewer
+latest_part = None
+# Bumped on every new frame; viewers wait on frame_cond until it moves past
+# the last sequence they sent
+frame_seq = 0
+frame_cond = threading.Condition()
+
+# Run the face detector on every Nth frame and reuse its boxes in between
+DETECT_EVERY = 3
 
 def init_camera():
     """Initialize camera in background thread"""
@@ -25,30 +38,39 @@ def init_camera():
     
     # Start frame capture thread
     def capture_thread():
-        global latest_frame
+        global latest_frame, latest_part, frame_seq
+        frame_counter = 0
+        frame_id = 0
+        faces = []
         while True:
-            frame = camera.read()
+            # Woken by the capture thread as each frame lands
+            frame, frame_id = camera.wait_for_next(frame_id)
             if frame is not None:
                 # Process for recognition
-                faces = recognizer.face_detector.detect(frame)
-                processed_frame = frame.copy()
+                if frame_counter % DETECT_EVERY == 0:
+                    # Half-size stream from the ISP; boxes come back in frame coordinates
+                    small = camera.read_lores()
+                    if small is not None:
+                        faces = recognizer.face_detector.detect(
+                            small, frame_size=(frame.shape[1], frame.shape[0]))
+                    else:
+                        faces = recognizer.face_detector.detect(frame)
+                frame_counter += 1
                 
-                # Draw detections
+                # The camera frame is a read-only view; copy only when drawing
+                if faces:
+                    frame = frame.copy()
                 for face in faces:
-                    startX, startY, endX, endY = face['box']
-                    confidence = face['confidence']
-                    
-                    color = (0, 255, 0)
-                    text = f"Face {confidence*100:.1f}%"
-                    y = startY - 10 if startY - 10 > 10 else startY + 10
-                    
-                    cv2.rectangle(processed_frame, (startX, startY), (endX, endY), color, 2)
-                    cv2.putText(processed_frame, text, (startX, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 2)
+                    draw_face_annotations(frame, face)
                 
-                with frame_lock:
-                    latest_frame = processed_frame
-            
-            time.sleep(0.033)  # ~30 FPS
+                # Encode once here; every MJPEG viewer reuses the bytes
+                frame_jpeg = encode_jpeg(frame, quality=STREAM_JPEG_QUALITY)
+                
+                with frame_cond:
+                    latest_frame = frame
+                    latest_part = mjpeg_part(frame_jpeg)
+                    frame_seq += 1
+                    frame_cond.notify_all()
     
     thread = threading.Thread(target=capture_thread, daemon=True)
     thread.start()
@@ -73,20 +95,15 @@ def index():
 def video_feed():
     """Video streaming route for local LAN access"""
     def generate():
+        last_seen = 0
         while True:
-            with frame_lock:
-                if latest_frame is not None:
-                    # Encode frame as JPEG
-                    _, buffer = cv2.imencode('.jpg', latest_frame)
-                    frame_bytes = buffer.tobytes()
-                else:
-                    time.sleep(0.1)
+            with frame_cond:
+                if not frame_cond.wait_for(lambda: frame_seq > last_seen, timeout=1.0):
                     continue
+                part = latest_part
+                last_seen = frame_seq
             
-            # MJPEG format
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            time.sleep(0.033)  # ~30 FPS
+            yield part
     
     return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
@@ -97,16 +114,19 @@ def get_status():
         'status': 'running',
         'camera': 'active' if camera else 'inactive',
         'recognizer': 'ready' if recognizer else 'not_ready',
-        'streaming': True
+        'streaming': True,
+        'frames_dropped': camera.frames_dropped if camera else 0
     })
 
 @app.route('/api/capture', methods=['POST'])
 def capture_image():
     """Capture a single image"""
-    with frame_lock:
-        if latest_frame is not None:
-            _, buffer = cv2.imencode('.jpg', latest_frame)
-            return Response(buffer.tobytes(), mimetype='image/jpeg')
+    with frame_cond:
+        frame = latest_frame
+    if frame is not None:
+        # Stills get their own full-quality encode, not the preview bytes
+        frame_bytes = encode_jpeg(frame, quality=CAPTURE_JPEG_QUALITY)
+        return Response(frame_bytes, mimetype='image/jpeg')
     
     return jsonify({'error': 'No frame available'}), 404
 
@@ -116,4 +136,8 @@ if __name__ == '__main__':
     
     # Start Flask server for local LAN access
     print("[INFO] Starting local server on http://0.0.0.0:5000")
-    app.run(host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
+    if HAVE_WAITRESS:
+        # Each MJPEG viewer holds a worker thread for the life of its stream
+        serve(app, host='0.0.0.0', port=5000, threads=8)
+    else:
+        app.run(host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
@@ -1,53 +1,292 @@
+import functools
+import io
 import cv2
 import numpy as np
-from picamera2 import Picamera2
+from picamera2 import Picamera2, MappedArray
+from picamera2.encoders import MJPEGEncoder
+from picamera2.outputs import FileOutput
+import os
+import sys
 import threading
 import time
+from jpeg_codec import encode_jpeg
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+GREEN = (0, 255, 0)    # detected face
+YELLOW = (0, 255, 255)  # recognized face
+
+# Motion gate: a frame counts as changed when an 80x60 grayscale thumbnail
+# differs from the last changed one by at least this mean absolute value
+MOTION_THUMB_SIZE = (80, 60)
+MOTION_THRESHOLD = float(os.getenv("MOTION_THRESHOLD", "4"))
+# Even a static scene counts as changed this often (seconds), so a face that
+# slipped past one detection is picked up by a later full scan
+MOTION_RESCAN_INTERVAL = 10.0
+
+
+@functools.lru_cache(maxsize=128)
+def _label(name, conf_pct):
+    return f"{name} {conf_pct:.1f}%"
+
+
+@functools.lru_cache(maxsize=32)
+def _text_sprite(text, scale, color):
+    """Pre-rendered label: (color patch, bool mask, baseline row within the patch)"""
+    (tw, th), baseline = cv2.getTextSize(text, FONT, scale, 2)
+    # Thickness 2 spills a pixel past the measured box on each side
+    mask = np.zeros((th + baseline + 2, tw + 2), dtype=np.uint8)
+    cv2.putText(mask, text, (1, th + 1), FONT, scale, 255, 2)
+    patch = np.empty(mask.shape + (3,), dtype=np.uint8)
+    patch[:] = color
+    return patch, mask[..., np.newaxis].astype(bool), th + 1
+
+
+def _put_label(frame, text, org, scale, color):
+    """cv2.putText, but glyphs are rasterized once per distinct label and blitted after"""
+    patch, mask, base = _text_sprite(text, scale, color)
+    x, y = org[0] - 1, org[1] - base
+    fh, fw = frame.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + patch.shape[1], fw), min(y + patch.shape[0], fh)
+    if x0 >= x1 or y0 >= y1:
+        return
+    np.copyto(frame[y0:y1, x0:x1], patch[y0 - y:y1 - y, x0 - x:x1 - x],
+              where=mask[y0 - y:y1 - y, x0 - x:x1 - x])
+
+
+def draw_face_annotations(frame, face, name=None, conf=None):
+    """Draw a detection box, or a recognition box when name/conf are given"""
+    startX, startY, endX, endY = face['box']
+    y = startY - 10 if startY - 10 > 10 else startY + 10
+
+    if name is None:
+        cv2.rectangle(frame, (startX, startY), (endX, endY), GREEN, 2)
+        _put_label(frame, _label("Face", round(float(face['confidence']) * 100, 1)),
+                   (startX, y), 0.45, GREEN)
+    else:
+        y_text = y - 20 if y - 20 > 10 else y + 20
+        cv2.rectangle(frame, (startX, startY), (endX, endY), YELLOW, 3)
+        _put_label(frame, _label(name, round(float(conf) * 100, 1)),
+                   (startX, y_text), 0.5, YELLOW)
+
+
+def crop_face_regions(frame, faces, margin=0.25, min_size=30):
+    """Crop each face with a margin around its box, skipping crops under min_size
+
+    Returns (crops, faces) for the crops kept; the crops are views of frame.
+    """
+    if not faces:
+        return [], []
+    h, w = frame.shape[:2]
+    boxes = np.array([face["box"] for face in faces], dtype=np.int32)
+    # Margin and clamp for every box at once
+    pad = ((boxes[:, 2:] - boxes[:, :2]) * margin).astype(np.int32)
+    limits = np.array([w, h], dtype=np.int32)
+    starts = np.clip(boxes[:, :2] - pad, 0, limits)
+    ends = np.clip(boxes[:, 2:] + pad, 0, limits)
+    keep = np.flatnonzero(((ends - starts) >= min_size).all(axis=1))
+
+    crops = [frame[starts[i, 1]:ends[i, 1], starts[i, 0]:ends[i, 0]] for i in keep]
+    return crops, [faces[i] for i in keep]
+
+
+class MotionGate:
+    """Cheap scene-change test used to skip face detection on static frames"""
+
+    def __init__(self, camera, threshold=MOTION_THRESHOLD, rescan_interval=MOTION_RESCAN_INTERVAL):
+        self.camera = camera
+        self.threshold = threshold
+        self.rescan_interval = rescan_interval
+        self._prev_thumb = None
+        self._prev_time = 0.0
+
+    def changed(self, frame):
+        """True if frame differs from the last frame that did (or there was none)"""
+        # The low-res stream's luma plane is already grayscale, so static
+        # frames never pay for a YUV -> BGR conversion
+        luma = self.camera.read_lores_gray()
+        if luma is not None:
+            thumb = cv2.resize(luma, MOTION_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        else:
+            thumb = cv2.cvtColor(cv2.resize(frame, MOTION_THUMB_SIZE, interpolation=cv2.INTER_AREA),
+                                 cv2.COLOR_BGR2GRAY)
+        now = time.monotonic()
+        if (self._prev_thumb is not None and now - self._prev_time < self.rescan_interval
+                and cv2.absdiff(thumb, self._prev_thumb).mean() < self.threshold):
+            return False
+        self._prev_thumb = thumb
+        self._prev_time = now
+        return True
+
+    def reset(self):
+        """Make the next frame count as changed"""
+        self._prev_thumb = None
+
+
+class _LatestJpeg(io.BufferedIOBase):
+    """MJPEGEncoder output that only keeps the newest JPEG"""
+
+    def __init__(self):
+        self.frame = None
+
+    def write(self, buf):
+        # Replaced wholesale, so readers take the reference without a lock
+        self.frame = buf
+        return len(buf)
+
 
 class Camera:
-    def __init__(self, resolution=(640, 480), framerate=30):
+    def __init__(self, resolution=(640, 480), framerate=30, ring_size=3, hw_jpeg=False):
         self.resolution = resolution
         self.framerate = framerate
         self.picam2 = None
         self.latest_frame = None
-        self.frame_lock = threading.Lock()
+        # Half-size YUV420 stream from the ISP, used for face detection
+        self.lores_size = (resolution[0] // 2, resolution[1] // 2)
+        self.latest_lores = None
+        # Preallocated frame slots reused by the capture loop; readers get
+        # read-only views so nothing is copied per read
+        self.ring_size = ring_size
+        self._slots = []
+        self._write_idx = 0
+        # Guards latest_frame; notified with a new _frame_id on every capture
+        self._cond = threading.Condition()
+        self._frame_id = 0
+        # Frames that landed while wait_for_next() callers were still busy;
+        # they were never processed, only superseded
+        self.frames_dropped = 0
         self.streaming = False
         self.thread = None
+        # (items, boxes array, names) for the last recognized_faces dict seen
+        self._recognized_cache = None
+        # Main stream also JPEG-encoded by the Pi's hardware encoder, so
+        # un-annotated stream frames cost no CPU to encode
+        self.hw_jpeg = hw_jpeg
+        self._jpeg_output = None
         
     def start_capture(self):
         """Start camera capture in a separate thread"""
         self.picam2 = Picamera2()
         config = self.picam2.create_video_configuration(
-            main={"size": self.resolution, "format": "RGB888"},
-            controls={"FrameRate": self.framerate}
+            # The ISP emits this channel order directly, so no per-frame
+            # cv2.cvtColor swizzle is needed
+            main={"size": self.resolution, "format": "BGR888"},
+            lores={"size": self.lores_size, "format": "YUV420"},
+            controls={"FrameRate": self.framerate},
+            # Don't keep a finished frame queued for the next capture_request:
+            # the loop always waits for a fresh one instead of taking a frame
+            # that may be a whole period old
+            queue=False
         )
         self.picam2.configure(config)
         self.picam2.start()
         self.streaming = True
+
+        if self.hw_jpeg:
+            try:
+                output = _LatestJpeg()
+                self.picam2.start_encoder(MJPEGEncoder(), FileOutput(output))
+                self._jpeg_output = output
+            except Exception as e:
+                # e.g. a Pi 5, which has no hardware JPEG block
+                print(f"[WARN] Hardware JPEG encoder unavailable: {e}")
         
         def capture_loop():
             while self.streaming:
                 try:
-                    frame = self.picam2.capture_array()
-                    if frame is not None:
-                        # Convert RGB to BGR for OpenCV
-                        frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                        with self.frame_lock:
-                            self.latest_frame = frame_bgr
+                    # Both streams come from the same request, so they match.
+                    # The main image is copied straight out of the mapped DMA
+                    # buffer into a ring slot (make_array would copy twice), and
+                    # the request goes back to the ISP as soon as that is done
+                    request = self.picam2.capture_request()
+                    try:
+                        with MappedArray(request, "main") as mapped:
+                            idx = self._next_slot(mapped.array)
+                            np.copyto(self._slots[idx], mapped.array)
+                        lores = request.make_array("lores")
+                    finally:
+                        request.release()
+
+                    with self._cond:
+                        self._write_idx = idx
+                        self.latest_frame = self._slots[idx]
+                        self.latest_lores = lores
+                        self._frame_id += 1
+                        self._cond.notify_all()
                 except Exception as e:
                     print(f"[ERROR] Camera capture error: {e}")
-                time.sleep(1/self.framerate)
+                    # capture_request() paces the loop itself; only back off on errors
+                    time.sleep(1/self.framerate)
         
         self.thread = threading.Thread(target=capture_loop, daemon=True)
         self.thread.start()
         print(f"[INFO] Camera started at {self.resolution[0]}x{self.resolution[1]} @ {self.framerate}fps")
     
+    def _next_slot(self, frame):
+        """Index of a ring slot that is neither published nor held by a reader"""
+        if not self._slots or self._slots[0].shape != frame.shape:
+            self._slots = [np.empty_like(frame) for _ in range(self.ring_size)]
+            self._write_idx = -1
+
+        for offset in range(1, len(self._slots) + 1):
+            idx = (self._write_idx + offset) % len(self._slots)
+            # Views handed out by read() keep a reference to their slot; the
+            # list and getrefcount's argument account for the baseline of 2
+            if idx != self._write_idx and sys.getrefcount(self._slots[idx]) == 2:
+                return idx
+
+        # Every slot is still referenced by a slow reader: grow the ring
+        self._slots.append(np.empty_like(frame))
+        return len(self._slots) - 1
+
+    def _latest_view(self):
+        if self.latest_frame is None:
+            return None
+        view = self.latest_frame.view()
+        view.flags.writeable = False
+        return view
+
     def read(self):
-        """Get the latest frame"""
-        with self.frame_lock:
-            if self.latest_frame is None:
-                return None
-            return self.latest_frame.copy()
+        """Get a read-only view of the latest frame; copy it before drawing on it"""
+        with self._cond:
+            return self._latest_view()
+
+    def read_lores(self):
+        """Get the low-res frame captured with the latest frame, as BGR"""
+        with self._cond:
+            yuv = self.latest_lores
+        if yuv is None:
+            return None
+        # YUV420 rows may be padded to the stride; crop back to the real width
+        bgr = cv2.cvtColor(yuv, cv2.COLOR_YUV420p2BGR)
+        return bgr[:, :self.lores_size[0]]
+
+    def read_lores_gray(self):
+        """Get the Y (luma) plane of the latest low-res frame; no conversion"""
+        with self._cond:
+            yuv = self.latest_lores
+        if yuv is None:
+            return None
+        return yuv[:self.lores_size[1], :self.lores_size[0]]
+
+    def read_jpeg(self):
+        """Latest hardware-encoded JPEG of the main stream, or None without one"""
+        if self._jpeg_output is None:
+            return None
+        return self._jpeg_output.frame
+
+    def wait_for_next(self, last_id, timeout=1.0):
+        """Block until a frame newer than last_id arrives
+
+        Returns (frame, frame_id) as a read-only view, or (None, last_id) on
+        timeout. Copy the frame before drawing on it.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frame_id > last_id, timeout=timeout):
+                return None, last_id
+            if last_id:
+                self.frames_dropped += self._frame_id - last_id - 1
+            return self._latest_view(), self._frame_id
     
     def stop(self):
         """Stop camera capture"""
@@ -55,6 +294,8 @@ class Camera:
         if self.thread:
             self.thread.join(timeout=2)
         if self.picam2:
+            if self._jpeg_output is not None:
+                self.picam2.stop_encoder()
             self.picam2.stop()
             self.picam2.close()
         print("[INFO] Camera stopped")
@@ -66,16 +307,19 @@ class Camera:
             return None
         
         # Encode as JPEG
-        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
-        return buffer.tobytes()
+        return encode_jpeg(frame, quality=quality)
     
     def get_frame_with_detections(self, detections, recognized_faces=None):
-        """Get frame with drawn detection boxes"""
+        """Get frame with drawn detection boxes (the read-only frame if there are none)"""
         frame = self.read()
         if frame is None:
             return None
         
+        if not detections:
+            return frame
+
         frame_copy = frame.copy()
+        rec_boxes, rec_names = self._recognized_arrays(recognized_faces)
         
         # Draw detections
         for detection in detections:
@@ -86,19 +330,28 @@ class Camera:
             color = (0, 255, 0)  # Green for detected faces
             label = "Face"
             
-            # Check if this face was recognized
-            if recognized_faces:
-                for i, (face_box, person_name) in enumerate(recognized_faces.items()):
-                    if (abs(startX - face_box[0]) < 20 and abs(startY - face_box[1]) < 20 and
-                        abs(endX - face_box[2]) < 20 and abs(endY - face_box[3]) < 20):
-                        label = person_name
-                        color = (0, 255, 255)  # Yellow for recognized faces
-                        break
+            # Check if this face was recognized (all corners within 20px)
+            if rec_names:
+                mask = np.all(np.abs(rec_boxes - (startX, startY, endX, endY)) < 20, axis=1)
+                if mask.any():
+                    label = rec_names[int(np.argmax(mask))]
+                    color = (0, 255, 255)  # Yellow for recognized faces
             
             text = f"{label} {confidence*100:.1f}%"
             y = startY - 10 if startY - 10 > 10 else startY + 10
             
             cv2.rectangle(frame_copy, (startX, startY), (endX, endY), color, 2)
-            cv2.putText(frame_copy, text, (startX, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 2)
+            _put_label(frame_copy, text, (startX, y), 0.45, color)
         
-        return frame_copy
\ No newline at end of file
+        return frame_copy
+
+    def _recognized_arrays(self, recognized_faces):
+        """Stack recognized boxes into an (M, 4) array, reused while unchanged"""
+        if not recognized_faces:
+            return None, []
+
+        items = tuple(recognized_faces.items())
+        if self._recognized_cache is None or self._recognized_cache[0] != items:
+            rec_boxes = np.array([list(box) for box, _ in items], dtype=np.int32)
+            self._recognized_cache = (items, rec_boxes, [name for _, name in items])
+        return self._recognized_cache[1], self._recognized_cache[2]
@@ -1,9 +1,10 @@
 import time
 import threading
-import cv2
+import queue
 import numpy as np
-from camera import Camera
-from recognizer import Recognizer, FaceDetector
+from camera import Camera, MotionGate, crop_face_regions, draw_face_annotations
+from jpeg_codec import encode_jpeg
+from recognizer import Recognizer
 from hardware import Relay, Buzzer, LCD, YellowIndicator, RedIndicator, Button
 from api_client import api_client
 import uuid
@@ -23,7 +24,8 @@ class DeviceService:
         # Initialize components
         self.camera = Camera(resolution=(640, 480), framerate=15)
         self.recognizer = Recognizer()
-        self.face_detector = FaceDetector()
+        # Share the recognizer's detector rather than loading the SSD twice
+        self.face_detector = self.recognizer.face_detector
         
         # Hardware components
         self.relay = Relay(4)
@@ -37,6 +39,31 @@ class DeviceService:
         self.processing = False
         self.streaming = False
         self.door_locked = True
+        # Last door state fetched from the backend; reused by
+        # _get_door_state() until it is older than door_state_ttl
+        self.door_state = 'locked'
+        self.door_state_ttl = 1.0
+        self._door_state_time = 0
+        # Faces are ignored until this time while a grant/deny sequence plays out
+        self.next_event_time = 0
+        self.event_cooldown = 2  # seconds
+
+        # Thumbnail and faces from the last detector run, reused while the
+        # scene is static
+        self._motion = MotionGate(self.camera)
+        self._prev_faces = []
+
+        # LCD/relay/buzzer/indicator sequences run on their own thread so
+        # their delays never stall the frame loop
+        self._hw_q = queue.Queue()
+        self._hw_thread = threading.Thread(target=self._run_hardware_queue, daemon=True)
+        self._hw_thread.start()
+
+        # Uploads and notifications go through one network worker; if it
+        # falls behind, the oldest pending event report is dropped
+        self._net_q = queue.Queue(maxsize=4)
+        self._net_thread = threading.Thread(target=self._run_network_queue, daemon=True)
+        self._net_thread.start()
         
         # Call state
         self.call_in_progress = False
@@ -48,6 +75,73 @@ class DeviceService:
         
         print(f"[INFO] Device service initialized for device: {device_id}")
     
+    def _run_hardware_queue(self):
+        """Worker thread: run each hardware action, then hold for its delay"""
+        while True:
+            action, hold = self._hw_q.get()
+            try:
+                action()
+            except Exception as e:
+                print(f"[ERROR] Hardware action failed: {e}")
+            if hold:
+                time.sleep(hold)
+
+    def _hardware(self, action, hold=0):
+        """Queue a hardware action; the next queued action starts hold seconds later"""
+        self._hw_q.put((action, hold))
+
+    def _run_network_queue(self):
+        """Worker thread: run queued upload/notification jobs in order"""
+        while True:
+            job = self._net_q.get()
+            try:
+                job()
+            except Exception as e:
+                print(f"[ERROR] Network job failed: {e}")
+
+    def _network(self, job):
+        """Queue a network job, discarding the oldest one when the queue is full"""
+        while True:
+            try:
+                self._net_q.put_nowait(job)
+                return
+            except queue.Full:
+                try:
+                    self._net_q.get_nowait()
+                    print("[WARN] Network queue full, dropped oldest event report")
+                except queue.Empty:
+                    pass
+
+    def _get_door_state(self):
+        """Return the door state, asking the backend only when the cache is stale"""
+        now = time.time()
+        if api_client and now - self._door_state_time >= self.door_state_ttl:
+            state = api_client.get_door_state()
+            if state is not None:
+                self.door_state = state
+            # A failed fetch also waits out the TTL instead of retrying per face
+            self._door_state_time = now
+        return self.door_state
+
+    def _block_events(self, duration):
+        self.next_event_time = time.time() + duration + self.event_cooldown
+        # Frames after a door event always get a fresh detection
+        self._motion.reset()
+
+    def _detect_faces(self, frame):
+        """Run the face detector, or reuse its last result if nothing moved"""
+        if not self._motion.changed(frame):
+            return list(self._prev_faces)
+
+        # Detect on the low-res stream; boxes come back in frame coordinates
+        small = self.camera.read_lores()
+        if small is not None:
+            faces = self.face_detector.detect(small, frame_size=(frame.shape[1], frame.shape[0]))
+        else:
+            faces = self.face_detector.detect(frame)
+        self._prev_faces = faces
+        return faces
+
     def _init_api_client(self):
         """Initialize API client"""
         global api_client
@@ -58,8 +152,7 @@ class DeviceService:
         """Capture image and upload to Supabase captured-faces bucket"""
         try:
             # Convert frame to JPEG bytes
-            _, buffer = cv2.imencode('.jpg', frame)
-            image_bytes = buffer.tobytes()
+            image_bytes = encode_jpeg(frame, quality=80)
             
             # Generate filename
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -142,45 +235,29 @@ class DeviceService:
         if frame is None:
             return None, None
         
-        # Get current door state
-        door_state = api_client.get_door_state() if api_client else 'locked'
-        
-        # Detect faces using DNN
-        faces = self.face_detector.detect(frame)
+        faces = self._detect_faces(frame)
         
-        # Prepare frame for streaming (with detection boxes)
-        stream_frame = frame.copy()
+        # Prepare frame for streaming (with detection boxes). The camera frame
+        # is a read-only view that handlers still upload untouched, so copy
+        # only when there is something to draw
+        stream_frame = frame.copy() if faces else frame
         recognized_info = None
         
         if faces:
-            # Try recognition on detected faces
             for face in faces:
-                startX, startY, endX, endY = face['box']
-                confidence = face['confidence']
-                
-                # Draw detection box
-                color = (0, 255, 0)  # Green for detection
-                text = f"Face {confidence*100:.1f}%"
-                y = startY - 10 if startY - 10 > 10 else startY + 10
-                
-                cv2.rectangle(stream_frame, (startX, startY), (endX, endY), color, 2)
-                cv2.putText(stream_frame, text, (startX, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 2)
-                
-                # Try recognition
-                recognized, info = self.recognizer.recognize(frame)
-                if recognized:
+                draw_face_annotations(stream_frame, face)
+
+            # Crop every detected face with a margin, then recognize them in one batch
+            crops, crop_faces = crop_face_regions(frame, faces)
+
+            if crops:
+                idx, info = self.recognizer.recognize_faces(crops)
+                if idx is not None:
                     # Draw recognition box
-                    name = info.get('name', 'Recognized')
-                    rec_confidence = info.get('confidence', 0)
-                    color = (0, 255, 255)  # Yellow for recognized
-                    text = f"{name} {rec_confidence*100:.1f}%"
-                    
-                    cv2.rectangle(stream_frame, (startX, startY), (endX, endY), color, 3)
-                    cv2.putText(stream_frame, text, (startX, y-20 if y-20 > 10 else y+20), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+                    draw_face_annotations(stream_frame, crop_faces[idx], info.get('name', 'Recognized'),
+                                          info.get('confidence', 0))
                     
                     recognized_info = info
-                    break
         
         # Queue frame for streaming
         if api_client and self.streaming:
@@ -196,74 +273,74 @@ class DeviceService:
         print(f"[INFO] Recognized: {name} (confidence: {confidence:.2f})")
         
         # Update LCD
-        self.lcd.display("Welcome", name[:16])
-        
-        # Capture and upload image
-        image_url = self.capture_and_upload_to_supabase(frame, name, "recognized")
-        
-        # Check door state
-        door_state = api_client.get_door_state() if api_client else 'locked'
+        self._hardware(lambda: self.lcd.display("Welcome", name[:16]))
         
-        if door_state == 'locked':
+        if self._get_door_state() == 'locked':
             # Door is locked, don't open
-            self.lcd.display("Door Locked", "Access Denied")
-            self.red_indicator.on()
-            self.buzzer.beep(200)
-            
-            # Send notification
-            if api_client:
-                api_client.send_notification(
-                    status='recognized_denied',
-                    image_data=frame,
-                    confidence=confidence,
-                    person_name=name,
-                    image_url=image_url
-                )
-            
-            time.sleep(3)
-            self.red_indicator.off()
+            def deny():
+                self.lcd.display("Door Locked", "Access Denied")
+                self.red_indicator.on()
+                self.buzzer.beep(200)
+
+            self._hardware(deny, 3)
+            self._hardware(self.red_indicator.off)
+            self._block_events(3)
+            status = 'recognized_denied'
             
         else:
             # Door is unlocked, grant access
-            self.relay.open()
-            self.yellow_indicator.on()
-            self.buzzer.beep(100)
-            
-            # Send notification
+            def grant():
+                self.relay.open()
+                self.yellow_indicator.on()
+                self.buzzer.beep(100)
+
+            def relock():
+                self.relay.close()
+                self.yellow_indicator.off()
+
+            self._hardware(grant, 5)
+            self._hardware(relock)
+            self._block_events(5)
+            status = 'recognized_granted'
+
+        # Capture, upload and notify off the frame loop
+        def report():
+            image_url = self.capture_and_upload_to_supabase(frame, name, "recognized")
             if api_client:
                 api_client.send_notification(
-                    status='recognized_granted',
+                    status=status,
                     image_data=frame,
                     confidence=confidence,
                     person_name=name,
                     image_url=image_url
                 )
-            
-            time.sleep(5)
-            self.relay.close()
-            self.yellow_indicator.off()
+
+        self._network(report)
     
     def handle_unrecognized_person(self, frame, faces_count=1):
         """Handle actions when no person is recognized"""
         print(f"[INFO] Unrecognized person detected ({faces_count} faces)")
         
-        self.lcd.display("Access Denied", "Unknown Person")
-        self.red_indicator.on()
-        self.buzzer.beep(300)
-        
-        # Capture and upload image
-        image_url = self.capture_and_upload_to_supabase(frame, "Unknown", "unrecognized")
-        
-        # Send notification
-        if api_client:
-            api_client.send_notification(
-                status='unrecognized',
-                image_data=frame,
-                image_url=image_url
-            )
+        def deny():
+            self.lcd.display("Access Denied", "Unknown Person")
+            self.red_indicator.on()
+            self.buzzer.beep(300)
+
+        self._hardware(deny, 3)
+        self._hardware(self.red_indicator.off)
+        self._block_events(3)
         
-        time.sleep(3)
-        self.red_indicator.off()
+        # Capture, upload and notify off the frame loop
+        def report():
+            image_url = self.capture_and_upload_to_supabase(frame, "Unknown", "unrecognized")
+            if api_client:
+                api_client.send_notification(
+                    status='unrecognized',
+                    image_data=frame,
+                    image_url=image_url
+                )
+
+        self._network(report)
     
     def start_streaming(self):
         """Start streaming to backend"""
@@ -291,30 +368,27 @@ class DeviceService:
         
         # Start streaming
         self.start_streaming()
+
+        # Manual call to owner; presses arrive as GPIO edge interrupts
+        self.button.on_press(self.initiate_call_to_owner)
         
         self.lcd.display("Ready", "Door Locked")
         print("[INFO] Device service started")
         
         # Main processing loop
+        frame_id = 0
         try:
             while True:
-                # Read frame from camera
-                frame = self.camera.read()
+                # Wait for the next camera frame
+                frame, frame_id = self.camera.wait_for_next(frame_id)
                 if frame is None:
-                    time.sleep(0.1)
                     continue
                 
                 # Process frame (detection, recognition, streaming)
                 faces, recognized_info = self.process_frame(frame)
                 
-                # Check for button press (manual call to owner)
-                if self.button.is_pressed():
-                    self.initiate_call_to_owner()
-                    # Debounce - wait a bit after button press
-                    time.sleep(0.5)
-                
-                # If faces detected and not currently processing
-                if faces and not self.processing:
+                # If faces detected and no grant/deny sequence is still playing
+                if faces and not self.processing and time.time() >= self.next_event_time:
                     self.processing = True
                     
                     if recognized_info:
@@ -323,10 +397,6 @@ class DeviceService:
                         self.handle_unrecognized_person(frame, len(faces))
                     
                     self.processing = False
-                    time.sleep(2)  # Cooldown after processing
-                
-                # Small delay to control processing rate
-                time.sleep(0.1)
                 
         except KeyboardInterrupt:
             print("[INFO] Shutting down...")
@@ -1,9 +1,10 @@
 import threading
 import time
-import cv2
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-from camera import Camera
+from camera import Camera, MotionGate, crop_face_regions, draw_face_annotations
+from jpeg_codec import STREAM_JPEG_QUALITY, encode_jpeg, mjpeg_part
 from security import decrypt_request
 from recognizer import Recognizer
 from hardware import Relay, Buzzer, LCD, YellowIndicator, RedIndicator, Button
@@ -11,6 +12,16 @@ from api_client import api_client
 import os
 from datetime import datetime
 
+# Run the DNN face detector on every Nth frame and carry its boxes forward
+DETECT_EVERY = 3
+
+# Event uploads queued or running at once; past this new ones are dropped
+# rather than piling up behind a slow network
+UPLOAD_BACKLOG = 4
+
+# How long a recognition result keeps labelling the matching box on the stream
+RECOGNIZED_OVERLAY_TTL = 1.0
+
 # Flask app for local MJPEG streaming
 app = Flask(__name__)
 CORS(app)
@@ -22,7 +33,7 @@ class DeviceServiceLocal:
         self.base_url = base_url if base_url else os.getenv("BACKEND_URL")
 
         # Camera & recognizer
-        self.camera = Camera(resolution=(640, 480), framerate=15)
+        self.camera = Camera(resolution=(640, 480), framerate=15, hw_jpeg=True)
         self.recognizer = Recognizer(threshold=0.60, base_url=self.base_url)
         self.face_detector = self.recognizer.face_detector
 
@@ -40,10 +51,32 @@ class DeviceServiceLocal:
         self.last_button_press = 0
         self.button_debounce_time = 2
         self.local_door_state = "locked"
-
-        # MJPEG frame
-        self.latest_frame = None
-        self.frame_lock = threading.Lock()
+        self._frame_idx = 0
+        self._last_faces = []
+        # Detection is skipped while the scene is static
+        self._motion = MotionGate(self.camera)
+        # Door sequences finish on a timer so the frame loop never sleeps;
+        # new events are skipped while one is in progress
+        self._door_timer = None
+        self._door_busy = False
+        # Event photo encode + upload runs off the frame/recognition threads
+        self._upload_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="upload")
+        self._upload_slots = threading.BoundedSemaphore(UPLOAD_BACKLOG)
+
+        # MJPEG frame: encoded once per processed frame and shared by all viewers
+        self._latest_part = b''
+        self._jpeg_version = 0
+        self._mjpeg_clients = 0
+        self.frame_cond = threading.Condition()
+        # Newest annotated frame waiting for the encode thread (newest wins)
+        self._pending_frame = None
+        self._encode_cond = threading.Condition()
+        # Newest (frame, faces) waiting for the recognition worker; a fresher
+        # frame simply replaces one that hasn't been picked up yet
+        self._pending = None
+        self._pending_cv = threading.Condition()
+        # (box, info, monotonic time) of the last recognized face, drawn on the stream
+        self._last_recognized = None
 
         # API client
         self._init_api_client()
@@ -63,67 +96,58 @@ class DeviceServiceLocal:
         self.lcd.display("Ready", "Door Locked")
 
         def loop():
+            frame_id = 0
             while True:
-                frame = self.camera.read()
+                frame, frame_id = self.camera.wait_for_next(frame_id)
                 if frame is None:
-                    time.sleep(0.05)
                     continue
 
-                # Face detection
-                faces = self.face_detector.detect(frame)
-                processed_frame = frame.copy()
-                recognized_info = None
-
-                for face in faces:
-                    startX, startY, endX, endY = face["box"]
-                    confidence = face["confidence"]
-                    color = (0, 255, 0)
-                    y = startY - 10 if startY - 10 > 10 else startY + 10
-                    cv2.rectangle(processed_frame, (startX, startY), (endX, endY), color, 2)
-                    cv2.putText(processed_frame, f"Face {confidence*100:.1f}%", (startX, y),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 2)
-
-                    # face_region = frame[startY:endY, startX:endX]
-                    margin = 0.25
-                    h, w = frame.shape[:2]
-
-                    dx = int((endX - startX) * margin)
-                    dy = int((endY - startY) * margin)
-
-                    x1 = max(0, startX - dx)
-                    y1 = max(0, startY - dy)
-                    x2 = min(w, endX + dx)
-                    y2 = min(h, endY + dy)
-
-                    face_region = frame[y1:y2, x1:x2]
-
-                    if face_region is None or face_region.size == 0:
-                        continue
+                # Face detection; in-between frames reuse the last boxes
+                fresh = self._frame_idx % DETECT_EVERY == 0
+                self._frame_idx += 1
+                if fresh:
+                    self._last_faces = self._detect(frame)
+                faces = self._last_faces
+
+                # Frames without boxes go out as the camera's hardware JPEG;
+                # the rest are annotated and handed to the encode thread.
+                # Nobody watching means nothing to copy, draw or encode
+                if self._mjpeg_clients > 0:
+                    hw_jpeg = None if faces else self.camera.read_jpeg()
+                    if hw_jpeg is not None:
+                        self._publish_jpeg(hw_jpeg)
+                    else:
+                        annotated = self._annotate(frame, faces)
+                        with self._encode_cond:
+                            self._pending_frame = annotated
+                            self._encode_cond.notify()
+
+                # Recognition runs on its own thread so the stream keeps the
+                # detector's pace; the clean frame is still needed for uploads
+                if faces and fresh:
+                    with self._pending_cv:
+                        self._pending = (frame, faces)
+                        self._pending_cv.notify()
+
+        def recognize_loop():
+            while True:
+                with self._pending_cv:
+                    self._pending_cv.wait_for(lambda: self._pending is not None)
+                    frame, faces = self._pending
+                    self._pending = None
 
-                    h, w = face_region.shape[:2]
-                    if h < 30 or w < 30:
-                        continue
+                recognized_info = None
+                # Crops from this frame, recognized together in one batch
+                crops, crop_faces = crop_face_regions(frame, faces)
 
-                    face_region = cv2.resize(face_region, (160, 160), interpolation=cv2.INTER_AREA)
-                    recognized, info = self.recognizer.recognize_face(face_region)
-
-                    if recognized:
-                        name = info.get("name", "Recognized")
-                        rec_conf = info.get("confidence", 0)
-                        color = (0, 255, 255)
-                        cv2.rectangle(processed_frame, (startX, startY), (endX, endY), color, 3)
-                        y_text = y-20 if y-20 > 10 else y+20
-                        cv2.putText(processed_frame, f"{name} {rec_conf*100:.1f}%", (startX, y_text),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+                if crops:
+                    idx, info = self.recognizer.recognize_faces(crops)
+                    if idx is not None:
+                        self._last_recognized = (crop_faces[idx]["box"], info, time.monotonic())
                         recognized_info = info
-                        break
-
-                # Save frame for streaming
-                with self.frame_lock:
-                    self.latest_frame = processed_frame
 
                 # Hardware / door handling
-                if faces and not self.processing:
+                if not self.processing and not self._door_busy:
                     self.processing = True
                     if recognized_info:
                         self.handle_recognized_person(recognized_info, frame)
@@ -131,23 +155,62 @@ class DeviceServiceLocal:
                         self.handle_unrecognized_person(frame, len(faces))
                     self.processing = False
 
-                # Button check
-                if self.button.is_pressed():
-                    self.initiate_call_to_owner()
-                    time.sleep(0.5)
+        def encode_loop():
+            while True:
+                with self._encode_cond:
+                    self._encode_cond.wait_for(lambda: self._pending_frame is not None)
+                    frame = self._pending_frame
+                    self._pending_frame = None
 
-                time.sleep(0.05)
+                self._publish_jpeg(encode_jpeg(frame, quality=STREAM_JPEG_QUALITY))
 
-        thread = threading.Thread(target=loop, daemon=True)
+        threading.Thread(target=encode_loop, name="mjpeg-encode", daemon=True).start()
+
+        thread = threading.Thread(target=loop, name="detect", daemon=True)
         thread.start()
+        threading.Thread(target=recognize_loop, name="recognize", daemon=True).start()
+        # Presses arrive as GPIO edge interrupts instead of being polled
+        self.button.on_press(self.initiate_call_to_owner)
 
     # ----------------------------
     # Recognition / Door / Notification
     # ----------------------------
+    def _publish_jpeg(self, frame_jpeg):
+        """Make frame_jpeg the current stream frame and wake the viewers"""
+        with self.frame_cond:
+            self._latest_part = mjpeg_part(frame_jpeg)
+            self._jpeg_version += 1
+            self.frame_cond.notify_all()
+
+    def _annotate(self, frame, faces):
+        """frame with boxes and the recent recognition drawn on a copy (frame itself if no faces)"""
+        if not faces:
+            return frame
+        # frame is a read-only camera view that uploads still need clean
+        annotated = frame.copy()
+        recent = self._last_recognized
+        if recent and time.monotonic() - recent[2] > RECOGNIZED_OVERLAY_TTL:
+            recent = None
+        for face in faces:
+            draw_face_annotations(annotated, face)
+            # Label the box the worker last recognized (all corners within 20px)
+            if recent and all(abs(a - b) < 20 for a, b in zip(face["box"], recent[0])):
+                draw_face_annotations(annotated, face, recent[1].get("name", "Recognized"),
+                                      recent[1].get("confidence", 0))
+        return annotated
+
+    def _detect(self, frame):
+        """Detect on the camera's half-size stream; boxes come back in frame coordinates"""
+        if not self._motion.changed(frame):
+            return self._last_faces
+        small = self.camera.read_lores()
+        if small is None:
+            return self.face_detector.detect(frame)
+        return self.face_detector.detect(small, frame_size=(frame.shape[1], frame.shape[0]))
+
     def capture_and_upload(self, frame, person_name="Unknown", status="unrecognized"):
         try:
-            _, buffer = cv2.imencode('.jpg', frame)
-            image_bytes = buffer.tobytes()
+            image_bytes = encode_jpeg(frame, quality=80)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"{person_name}_{status}_{timestamp}.jpg"
 
@@ -164,14 +227,20 @@ class DeviceServiceLocal:
         return None
 
 
-    def handle_recognized_person(self, info, frame):
-        name = info.get("name", "Unknown")
-        conf = info.get("confidence", 0)
-        conf = float(conf) if conf is not None else None
-        print(f"[INFO] Recognized: {name} ({conf:.2f})")
-        self.lcd.display("Welcome", name[:16])
-        image_url = self.capture_and_upload(frame, name, "recognized")
+    def _submit_upload(self, fn, *args):
+        """Run fn(*args) on the upload pool, or drop it if the backlog is full
+
+        Camera frames are ring-slot views; the slot stays reserved while the
+        job holds it, so no copy is needed.
+        """
+        if not self._upload_slots.acquire(blocking=False):
+            print("[WARN] Upload backlog full, dropping event upload")
+            return
+        future = self._upload_pool.submit(fn, *args)
+        future.add_done_callback(lambda _: self._upload_slots.release())
 
+    def _report_recognized(self, frame, name, conf):
+        image_url = self.capture_and_upload(frame, name, "recognized")
         if image_url and api_client:
             api_client.send_notification(
                 status="recognized",
@@ -180,16 +249,26 @@ class DeviceServiceLocal:
                 person_name=name
             )
 
+    def handle_recognized_person(self, info, frame):
+        name = info.get("name", "Unknown")
+        conf = info.get("confidence", 0)
+        conf = float(conf) if conf is not None else None
+        print(f"[INFO] Recognized: {name} ({conf:.2f})")
+        self.lcd.display("Welcome", name[:16])
+        # Encode, upload and notify on the pool so the door reacts immediately
+        self._submit_upload(self._report_recognized, frame, name, conf)
+
         self.relay.open()
         self.yellow_indicator.on()
         self.buzzer.beep(100)
         self.lcd.display("Access Granted", "Door Open")
-        time.sleep(5)
+        self._schedule_door(5, self._close_door)
+
+    def _close_door(self):
         self.relay.close()
         self.yellow_indicator.off()
         self.lcd.display("Door Locked", "Ready")
 
-
     def handle_unrecognized_person(self, frame, faces_count=1):
         self.relay.close()
         print(f"[INFO] Unrecognized person detected ({faces_count} faces)")
@@ -206,8 +285,21 @@ class DeviceServiceLocal:
         #         person_name="Unknown"
         #     )
 
-        time.sleep(3)
-        self.red_indicator.off()
+        self._schedule_door(3, self.red_indicator.off)
+
+    def _schedule_door(self, delay, callback):
+        """Run callback after delay on a timer; the door counts as busy until then"""
+        self._door_busy = True
+
+        def finish():
+            try:
+                callback()
+            finally:
+                self._door_busy = False
+
+        self._door_timer = threading.Timer(delay, finish)
+        self._door_timer.daemon = True
+        self._door_timer.start()
 
     def initiate_call_to_owner(self):
         current_time = time.time()
@@ -226,20 +318,28 @@ class DeviceServiceLocal:
     # Flask streaming routes
     # ----------------------------
     def mjpeg_frame_generator(self):
-        while True:
-            with self.frame_lock:
-                frame = self.latest_frame
-            if frame is not None:
-                _, buffer = cv2.imencode('.jpg', frame)
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-            time.sleep(0.03)
+        with self.frame_cond:
+            self._mjpeg_clients += 1
+            # Frames cached before this viewer joined may be stale
+            last_version = self._jpeg_version
+        try:
+            while True:
+                with self.frame_cond:
+                    if not self.frame_cond.wait_for(lambda: self._jpeg_version > last_version, timeout=1.0):
+                        continue
+                    part = self._latest_part
+                    last_version = self._jpeg_version
+                yield part
+        finally:
+            with self.frame_cond:
+                self._mjpeg_clients -= 1
 
 # ----------------------------
 # Flask routes
 # ----------------------------
 service = DeviceServiceLocal(os.getenv("DEVICE_ID"), os.getenv("BACKEND_URL"))
-service.start_camera_loop()
+# Gallery loading runs in the background so Flask binds right away
+threading.Thread(target=service.start_camera_loop, daemon=True).start()
 
 @app.route('/')
 def index():
@@ -255,7 +355,8 @@ def status():
     return jsonify({
         "status": "running",
         "camera": "active" if service.camera else "inactive",
-        "recognizer": "ready" if service.recognizer else "not_ready"
+        "recognizer": "ready" if service.recognizer else "not_ready",
+        "frames_dropped": service.camera.frames_dropped
     })
 
 @app.route("/api/door/control", methods=["POST"])
@@ -267,7 +368,6 @@ def door_control():
         return jsonify({"error": "missing payload"}), 400
 
     payload = decrypt_request(encrypted)
-    print("Decrypted payload:", payload)
     if not payload:
         return jsonify({"error": "invalid or expired request"}), 403
 
@@ -0,0 +1,73 @@
+"""One-time export of the DeepFace embedding model to ONNX for Recognizer(embedder_path=...)
+
+Usage: python export_embedder.py [model_name] [output.onnx] [calibration_dir]
+
+Also writes an int8 copy next to the output (output.int8.onnx), which is the
+one to use on the Pi. With a directory of face crops (e.g. saved event
+photos) the copy is statically quantized in QDQ format, so activations run
+through NEON dot-product kernels too; otherwise only weights are quantized.
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+import tensorflow as tf
+import tf2onnx
+from deepface import DeepFace
+
+# Calibration images used at most; a few hundred faces is plenty
+MAX_CALIBRATION_IMAGES = 500
+
+
+def load_calibration_batches(calibration_dir, input_name):
+    """Yield {input_name: (1, 160, 160, 3)} feeds prepared like Recognizer._embed_batch"""
+    names = sorted(f for f in os.listdir(calibration_dir)
+                   if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    for name in names[:MAX_CALIBRATION_IMAGES]:
+        img = cv2.imread(os.path.join(calibration_dir, name))
+        if img is None:
+            continue
+        img = cv2.resize(img, (160, 160), interpolation=cv2.INTER_AREA)
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        yield {input_name: (img[np.newaxis].astype(np.float32) / 255.0)}
+
+
+def export(model_name="Facenet512", output_path="models/facenet512.onnx", calibration_dir=None):
+    client = DeepFace.build_model(model_name)
+    # Newer deepface wraps the Keras model in a client object
+    model = getattr(client, "model", client)
+
+    # Batch dimension left open so recognize() can embed every face in one run
+    spec = (tf.TensorSpec((None, 160, 160, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=output_path)
+    print(f"[INFO] Exported {model_name} to {output_path}")
+
+    try:
+        from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                              quantize_dynamic, quantize_static)
+    except ImportError:
+        print("[WARN] onnxruntime not installed, skipping int8 quantization")
+        return
+
+    int8_path = output_path.rsplit(".", 1)[0] + ".int8.onnx"
+    if calibration_dir:
+        class FaceCrops(CalibrationDataReader):
+            def __init__(self):
+                self.batches = load_calibration_batches(calibration_dir, "input")
+
+            def get_next(self):
+                return next(self.batches, None)
+
+        quantize_static(output_path, int8_path, FaceCrops(),
+                        quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QInt8,
+                        weight_type=QuantType.QInt8)
+        print(f"[INFO] Statically quantized (QDQ) model written to {int8_path}")
+    else:
+        quantize_dynamic(output_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"[INFO] Quantized model written to {int8_path}")
+
+
+if __name__ == "__main__":
+    export(*sys.argv[1:4])
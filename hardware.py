@@ -1,4 +1,5 @@
 import os
+import threading
 import time
 
 try:
@@ -14,6 +15,12 @@ if REAL_GPIO:
     GPIO.setwarnings(False)
 
 
+def _start_timer(delay, fn, *args):
+    timer = threading.Timer(delay, fn, args=args)
+    timer.daemon = True
+    timer.start()
+
+
 class Relay:
     def __init__(self, pin: int):
         self.pin = pin
@@ -86,18 +93,29 @@ class Buzzer:
             GPIO.setup(self.pin, GPIO.OUT, initial=GPIO.LOW)
 
     def beep(self, ms: int = 100, repeat: int = 1):
+        """Start a beep and return; the pin is switched off on a timer thread"""
         if REAL_GPIO:
-            for _ in range(repeat):
-                GPIO.output(self.pin, GPIO.HIGH)
-                time.sleep(ms / 1000)
-                GPIO.output(self.pin, GPIO.LOW)
-                time.sleep(0.05)
+            self._pulse(ms / 1000, repeat)
         else:
             print(f"[HARDWARE SIM] Buzzer beep {ms}ms x{repeat}")
 
+    def _pulse(self, duration, remaining):
+        GPIO.output(self.pin, GPIO.HIGH)
+
+        def off():
+            GPIO.output(self.pin, GPIO.LOW)
+            if remaining > 1:
+                _start_timer(0.05, self._pulse, duration, remaining - 1)
+
+        _start_timer(duration, off)
+
 
 class LCD:
+    COLS = 16
+
     def __init__(self):
+        # What is on the panel now, so display() only writes changed cells
+        self._lines = ("", "")
         if not REAL_GPIO:
             print("[HARDWARE SIM] LCD initialized")
             return
@@ -112,18 +130,35 @@ class LCD:
         )
 
     def display(self, line1: str, line2: str = ""):
+        lines = (line1[:self.COLS], line2[:self.COLS])
+        if lines == self._lines:
+            return
         if REAL_GPIO:
-            self.lcd.clear()
-            self.lcd.write_string(line1[:16])
-            if line2:
-                self.lcd.cursor_pos = (1, 0)
-                self.lcd.write_string(line2[:16])
+            for row, (new, old) in enumerate(zip(lines, self._lines)):
+                self._write_changes(row, old, new)
         else:
             print(f"[LCD] {line1} | {line2}")
+        self._lines = lines
+
+    def _write_changes(self, row, old, new):
+        """Rewrite only the runs of cells that differ; padding blanks leftovers"""
+        old = old.ljust(self.COLS)
+        new = new.ljust(self.COLS)
+        col = 0
+        while col < self.COLS:
+            if old[col] == new[col]:
+                col += 1
+                continue
+            start = col
+            while col < self.COLS and old[col] != new[col]:
+                col += 1
+            self.lcd.cursor_pos = (row, start)
+            self.lcd.write_string(new[start:col])
 
     def clear(self):
         if REAL_GPIO:
             self.lcd.clear()
+        self._lines = ("", "")
 
 
 class Button:
@@ -132,6 +167,18 @@ class Button:
         if REAL_GPIO:
             GPIO.setup(self.pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
 
+    def on_press(self, callback, bouncetime: int = 200):
+        """Call callback() on each press from the GPIO edge-detect thread
+
+        Replaces polling is_pressed(); the kernel wakes us only on an edge.
+        """
+        if REAL_GPIO:
+            GPIO.add_event_detect(self.pin, GPIO.RISING,
+                                  callback=lambda _pin: callback(),
+                                  bouncetime=bouncetime)
+        else:
+            print(f"[HARDWARE SIM] Button {self.pin} press handler registered")
+
     def is_pressed(self) -> bool:
         if REAL_GPIO:
             print("Button is pressed")
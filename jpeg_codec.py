@@ -0,0 +1,40 @@
+import cv2
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    _turbo = TurboJPEG()
+    HAVE_TURBOJPEG = True
+except Exception:
+    HAVE_TURBOJPEG = False
+
+# Part header for multipart/x-mixed-replace; boundary=frame streams
+MJPEG_PART_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
+# Quality for live MJPEG previews: visually the same as 80-95 in a browser
+# at well under half the bytes
+STREAM_JPEG_QUALITY = 70
+
+# Quality for stills handed to the user; matches cv2.imencode's default
+CAPTURE_JPEG_QUALITY = 95
+
+# imencode parameter lists by quality, built once instead of per frame
+_imwrite_params = {}
+
+
+def encode_jpeg(frame, quality=80):
+    """Encode a BGR frame to JPEG bytes (libjpeg-turbo SIMD when available)"""
+    if HAVE_TURBOJPEG:
+        # 4:2:0 like libjpeg's default (PyTurboJPEG otherwise uses 4:2:2)
+        return _turbo.encode(frame, quality=quality, pixel_format=TJPF_BGR,
+                             jpeg_subsample=TJSAMP_420)
+
+    params = _imwrite_params.get(quality)
+    if params is None:
+        params = _imwrite_params[quality] = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    _, buffer = cv2.imencode('.jpg', frame, params)
+    return buffer.tobytes()
+
+
+def mjpeg_part(jpeg):
+    """One MJPEG stream part; build it once per frame and send it to every viewer"""
+    return b''.join((MJPEG_PART_HEADER, jpeg, b'\r\n'))
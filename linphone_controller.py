@@ -1,9 +1,11 @@
 import subprocess
 import threading
-import time
 import os
 import signal
 
+# Longest we wait for linphonec to report ready before sending commands anyway
+BOOT_TIMEOUT = 5
+
 class LinphoneController:
     def __init__(self, sip_target, soundcard_id=5, on_call_end=None):
         self.sip_target = sip_target
@@ -12,6 +14,9 @@ class LinphoneController:
         self.lock = threading.Lock()
         self.running = False
         self.on_call_end = on_call_end
+        # Set once linphonec prints "Ready"; commands wait on it instead of
+        # a fixed boot delay
+        self.ready = threading.Event()
 
     def start(self):
         if self.running:
@@ -27,23 +32,32 @@ class LinphoneController:
         )
 
         self.running = True
+        self.ready.clear()
 
         # Start output reader thread
         threading.Thread(target=self._read_output, daemon=True).start()
 
-        # Allow linphonec to boot
-        time.sleep(2)
+        # Select the soundcard once linphonec is up, without blocking the caller
+        threading.Thread(target=self._configure, daemon=True).start()
 
-        # Select soundcard
-        self._send(f"soundcard use {self.soundcard_id}")
-        time.sleep(1)
+    def _configure(self):
+        if not self.ready.wait(timeout=BOOT_TIMEOUT):
+            print("[WARN] linphonec did not report ready, sending commands anyway")
+            self._on_ready()
 
+    def _on_ready(self):
+        # Soundcard goes out before ready is set, so a waiting call() follows it
+        self._send(f"soundcard use {self.soundcard_id}")
+        self.ready.set()
         print("[LINPHONE] Ready")
 
     def _read_output(self):
         for line in self.process.stdout:
             print("[LINPHONE]", line.strip())
 
+            if not self.ready.is_set() and "Ready" in line:
+                self._on_ready()
+
             if "Call" in line and "ended" in line:
                 if self.on_call_end:
                     self.on_call_end()
@@ -62,6 +76,7 @@ class LinphoneController:
         if not self.running:
             self.start()
 
+        self.ready.wait(timeout=BOOT_TIMEOUT)
         print(f"[LINPHONE] Calling {self.sip_target}")
         self._send(f"call {self.sip_target}")
 
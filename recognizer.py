@@ -4,62 +4,291 @@ import numpy as np
 from typing import List, Dict, Tuple
 import threading
 import time
+import weakref
+import json
 import requests
 from supabase import create_client
 from dotenv import load_dotenv
 
 load_dotenv()
 
+try:
+    import onnxruntime as ort
+    HAVE_ONNXRUNTIME = True
+except ImportError:
+    HAVE_ONNXRUNTIME = False
+
+try:
+    import ijson
+    HAVE_IJSON = True
+except ImportError:
+    HAVE_IJSON = False
+
+try:
+    import simsimd
+    HAVE_SIMSIMD = True
+except ImportError:
+    HAVE_SIMSIMD = False
+
+try:
+    from pycoral.adapters import common as coral_common
+    from pycoral.adapters import detect as coral_detect
+    from pycoral.utils.edgetpu import make_interpreter
+    HAVE_PYCORAL = True
+except ImportError:
+    HAVE_PYCORAL = False
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+# On-disk copy of the backend gallery, reused across boots
+GALLERY_CACHE_DIR = os.getenv("GALLERY_CACHE_DIR", "/var/lib/doorbell")
+
+# simsimd has native half-precision kernels, so with it the gallery is kept
+# (and cached) as float16, halving its memory traffic. NumPy's float16
+# matmul is not BLAS-backed, so without simsimd it stays float32.
+# GALLERY_INT8=1 goes further and stores rows as int8 (scaled by 127), scored
+# with simsimd's int8 dot-product kernels; it costs a little precision
+GALLERY_INT8 = HAVE_SIMSIMD and os.getenv("GALLERY_INT8") == "1"
+if GALLERY_INT8:
+    GALLERY_DTYPE = np.int8
+else:
+    GALLERY_DTYPE = np.float16 if HAVE_SIMSIMD else np.float32
+
+
+def _to_gallery_dtype(x):
+    """Cast L2-normalized rows (or a probe) to GALLERY_DTYPE"""
+    if x.dtype == GALLERY_DTYPE:
+        return x
+    if x.dtype == np.int8:
+        x = x.astype(np.float32) / 127
+    if GALLERY_INT8:
+        return np.clip(np.round(x * 127), -127, 127).astype(np.int8)
+    return x.astype(GALLERY_DTYPE)
+
+# int8 ONNX export of the embedding model (see export_embedder.py); when set,
+# it replaces DeepFace for embeddings
+EMBEDDER_PATH = os.getenv("EMBEDDER_PATH")
+
+# Edge TPU compiled SSD face model (e.g. Coral's ssd_mobilenet_v2_face); when
+# set and a Coral is attached, face detection runs on the TPU
+EDGETPU_FACE_MODEL = os.getenv("EDGETPU_FACE_MODEL")
+
+# INT8-quantized ONNX export of the SSD face detector; when set it is loaded
+# instead of the FP32 Caffe model
+FACE_DETECTOR_ONNX = os.getenv("FACE_DETECTOR_ONNX")
+
+# FACE_DETECTOR_VULKAN=1 runs the SSD on the GPU through OpenCV's Vulkan
+# backend, when the OpenCV build actually provides a Vulkan target
+FACE_DETECTOR_VULKAN = os.getenv("FACE_DETECTOR_VULKAN") == "1"
+
+# Galleries up to this many rows are scored with the compiled loop below;
+# past that a BLAS matmul wins
+SMALL_GALLERY_ROWS = 64
+
+if HAVE_NUMBA:
+    @njit(cache=True, fastmath=True)
+    def _match_small(gallery, probes, early_accept):
+        """(probe index, gallery index, dot product) of the closest pair
+
+        Stops at the first pair scoring early_accept or more.
+        """
+        # Cosine is never below -1; an infinite start value would be undefined
+        # under fastmath, which assumes no infinities
+        best_b, best_i, best_s = 0, 0, -2.0
+        for b in range(probes.shape[0]):
+            for i in range(gallery.shape[0]):
+                s = 0.0
+                for k in range(gallery.shape[1]):
+                    s += gallery[i, k] * probes[b, k]
+                if s > best_s:
+                    best_s = s
+                    best_b = b
+                    best_i = i
+                    if best_s >= early_accept:
+                        return best_b, best_i, best_s
+        return best_b, best_i, best_s
+
 class FaceDetector:
     def __init__(self, prototxt_path="models/deploy.prototxt", 
-                 model_path="models/res10_300x300_ssd_iter_140000.caffemodel"):
-        self.net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
+                 model_path="models/res10_300x300_ssd_iter_140000.caffemodel",
+                 use_vulkan=FACE_DETECTOR_VULKAN, onnx_model_path=FACE_DETECTOR_ONNX, edgetpu_model_path=EDGETPU_FACE_MODEL):
+        self.interpreter = None
+        if edgetpu_model_path:
+            if HAVE_PYCORAL:
+                try:
+                    self.interpreter = make_interpreter(edgetpu_model_path)
+                    self.interpreter.allocate_tensors()
+                    print(f"[INFO] Face detector running on Edge TPU ({edgetpu_model_path})")
+                except Exception as e:
+                    print(f"[WARN] Edge TPU unavailable, face detector stays on CPU: {e}")
+                    self.interpreter = None
+            else:
+                print("[WARN] pycoral not installed, face detector stays on CPU")
+
+        self.net = None
+        if onnx_model_path:
+            # INT8-quantized export of the same SSD; output layout is unchanged
+            try:
+                self.net = cv2.dnn.readNetFromONNX(onnx_model_path)
+                self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+                self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+                print(f"[INFO] Face detector loaded from {onnx_model_path}")
+            except Exception as e:
+                print(f"[WARN] Failed to load ONNX face detector, using FP32 Caffe model: {e}")
+                self.net = None
+        if self.net is None:
+            self.net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
         self.confidence_threshold = 0.5
+
+        # Run the SSD on the Pi's VideoCore GPU when OpenCV was built with Vulkan
+        if use_vulkan:
+            if self._vulkan_available():
+                self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_VKCOM)
+                self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_VULKAN)
+                print("[INFO] Face detector using Vulkan backend")
+            else:
+                print("[WARN] No OpenCV Vulkan target available, face detector stays on CPU")
+        elif self._cuda_available():
+            # Same code on a Jetson / dGPU host picks up the CUDA backend
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA_FP16)
+            print("[INFO] Face detector using CUDA backend")
+
+        # Reused 300x300 network input and NCHW blob so detect() doesn't
+        # allocate a resize or a ~1 MB blob per call
+        self._input = np.empty((300, 300, 3), dtype=np.uint8)
+        self._blob = np.zeros((1, 3, 300, 300), dtype=np.float32)
+
+        # One throwaway forward so backend setup isn't paid on the first frame
+        try:
+            self.net.setInput(self._blob)
+            self.net.forward()
+        except Exception as e:
+            print(f"[WARN] Face detector warm-up failed: {e}")
+        self._mean = np.array([104.0, 177.0, 123.0], dtype=np.float32).reshape(3, 1, 1)
+
+        # Last (frame, frame_size) seen and its result, so handing the same
+        # frame in twice doesn't run the network twice. The weak reference
+        # avoids pinning a camera ring slot.
+        self._last_frame = None
+        self._last_key = None
+        self._last_faces = []
     
-    def detect(self, frame):
-        """Detect faces in frame using DNN"""
+    @staticmethod
+    def _vulkan_available():
+        # The VKCOM constants exist in every 4.x build; only the target list
+        # says whether Vulkan was compiled in and a device was found
+        try:
+            targets = cv2.dnn.getAvailableTargets(cv2.dnn.DNN_BACKEND_VKCOM)
+        except (AttributeError, cv2.error):
+            return False
+        return cv2.dnn.DNN_TARGET_VULKAN in targets
+
+    @staticmethod
+    def _cuda_available():
+        try:
+            return cv2.cuda.getCudaEnabledDeviceCount() > 0
+        except (AttributeError, cv2.error):
+            return False
+
+    def detect(self, frame, frame_size=None):
+        """Detect faces in frame using DNN
+
+        frame_size=(w, h) maps boxes onto a larger frame than the one detected
+        on, e.g. when running on the camera's low-res stream.
+        """
+        if (self._last_frame is not None and self._last_frame() is frame
+                and self._last_key == frame_size):
+            return list(self._last_faces)
+
         (h, w) = frame.shape[:2]
-        blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 1.0,
-                                     (300, 300), (104.0, 177.0, 123.0))
+        if frame_size is not None:
+            (w, h) = frame_size
+        if self.interpreter is not None:
+            faces = self._detect_edgetpu(frame, w, h)
+            self._last_frame = weakref.ref(frame)
+            self._last_key = frame_size
+            self._last_faces = faces
+            return list(faces)
+
+        cv2.resize(frame, (300, 300), dst=self._input)
+        # Same as blobFromImage(scale 1.0, no swapRB): HWC -> CHW minus the mean
+        np.subtract(self._input.transpose(2, 0, 1), self._mean, out=self._blob[0])
         
-        self.net.setInput(blob)
+        self.net.setInput(self._blob)
         detections = self.net.forward()
         
+        # Confidence filter and clamp for all detections at once
+        det = detections[0, 0]
+        keep = det[:, 2] > self.confidence_threshold
+        limits = np.array([w, h, w, h])
+        boxes = np.clip((det[keep, 3:7] * limits).astype(np.int32), 0, limits)
+        faces = [{'box': tuple(box), 'confidence': conf}
+                 for box, conf in zip(boxes.tolist(), det[keep, 2].tolist())]
+
+        self._last_frame = weakref.ref(frame)
+        self._last_key = frame_size
+        self._last_faces = faces
+        return list(faces)
+
+    def _detect_edgetpu(self, frame, w, h):
+        """detect() on the Coral; boxes come back scaled to w x h"""
+        in_w, in_h = coral_common.input_size(self.interpreter)
+        rgb = cv2.cvtColor(cv2.resize(frame, (in_w, in_h)), cv2.COLOR_BGR2RGB)
+        coral_common.set_input(self.interpreter, rgb)
+        self.interpreter.invoke()
+        objs = coral_detect.get_objects(self.interpreter, self.confidence_threshold,
+                                        (in_w / w, in_h / h))
         faces = []
-        for i in range(0, detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
-            
-            if confidence > self.confidence_threshold:
-                box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                (startX, startY, endX, endY) = box.astype("int")
-                
-                # Ensure bounding boxes fall within the dimensions of the frame
-                startX = max(0, startX)
-                startY = max(0, startY)
-                endX = min(w, endX)
-                endY = min(h, endY)
-                
-                faces.append({
-                    'box': (startX, startY, endX, endY),
-                    'confidence': confidence
-                })
-        
+        for obj in objs:
+            b = obj.bbox
+            box = (max(0, b.xmin), max(0, b.ymin), min(w, b.xmax), min(h, b.ymax))
+            faces.append({'box': box, 'confidence': float(obj.score)})
         return faces
 
 class Recognizer:
-    def __init__(self, model_name: str = 'Facenet512', detector_backend: str = 'opencv', threshold: float = 0.60, base_url = None):
+    def __init__(self, model_name: str = 'Facenet512', detector_backend: str = 'opencv', threshold: float = 0.60, base_url = None,
+                 embedder_path: str = EMBEDDER_PATH, embedder_threads: int = 4):
         import os
-        from deepface import DeepFace
 
         self.model_name = model_name
         self.detector_backend = detector_backend
         self.threshold = threshold
-        self.DeepFace = DeepFace
+        # A match this confident is taken without scanning the rest of the gallery
+        self.early_accept_threshold = 0.85
+        # deepface pulls in TensorFlow, which takes many seconds on a Pi; it is
+        # only imported when an embedding actually needs it
+        self._deepface = None
         self.embeddings = []
+        # (G, D) L2-normalized gallery rows and their names, scored in one matmul
+        self.gallery_matrix = np.empty((0, 0), dtype=np.float32)
+        self.gallery_names = []
+        # Embedder input batches: resized BGR crops and the float RGB tensor
+        # built from them, grown to the largest batch seen
+        self._crop_scratch = np.empty((0, 160, 160, 3), dtype=np.uint8)
+        self._batch_scratch = np.empty((0, 160, 160, 3), dtype=np.float32)
         self.base_url = base_url
+        # One keep-alive session for every gallery/embedding download
+        self._http = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16)
+        self._http.mount("https://", adapter)
+        self._http.mount("http://", adapter)
+        if base_url:
+            threading.Thread(target=self._warm_connection, args=(base_url,), daemon=True).start()
         
         # Initialize face detector
         self.face_detector = FaceDetector()
+
+        # Optional quantized ONNX export of model_name used instead of DeepFace
+        self.embedder = None
+        # DeepFace's underlying Keras model, built on the first batched embed
+        self._keras_model = None
+        if embedder_path:
+            self._load_embedder(embedder_path, embedder_threads)
         
         # Cache for recognized faces
         self.recognized_faces = {}
@@ -70,48 +299,206 @@ class Recognizer:
         if not self.device_id:
             print("[WARN] DEVICE_ID not set. Will load all images from bucket.")
 
+    @property
+    def DeepFace(self):
+        """The deepface module, imported (with TensorFlow) on first use"""
+        if self._deepface is None:
+            from deepface import DeepFace
+            self._deepface = DeepFace
+        return self._deepface
+
+    def _load_embedder(self, embedder_path, threads=4):
+        """Load an (int8) ONNX embedder, preferring the XNNPACK execution provider"""
+        if not HAVE_ONNXRUNTIME:
+            print("[WARN] onnxruntime not installed, using DeepFace embeddings")
+            return
+
+        available = ort.get_available_providers()
+        providers = [p for p in ("XnnpackExecutionProvider", "CPUExecutionProvider") if p in available]
+        so = ort.SessionOptions()
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        so.intra_op_num_threads = threads
+        self.embedder = ort.InferenceSession(embedder_path, sess_options=so, providers=providers)
+        self._embedder_input = self.embedder.get_inputs()[0].name
+
+        # One dummy run so kernel selection and arena allocation happen at
+        # startup rather than on the first face
+        try:
+            self.embedder.run(None, {self._embedder_input: np.zeros((1, 160, 160, 3), dtype=np.float32)})
+        except Exception as e:
+            print(f"[WARN] Embedder warm-up failed: {e}")
+        print(f"[INFO] ONNX embedder loaded ({providers[0]})")
+
+    def _embed_batch(self, face_regions):
+        """(B, D) embeddings for a list of BGR face crops (any size) in one forward pass
+
+        The input batch lives in buffers reused by the next call, so this is
+        not safe to call from two threads on one Recognizer.
+        """
+        n = len(face_regions)
+        if self._crop_scratch.shape[0] < n:
+            self._crop_scratch = np.empty((n, 160, 160, 3), dtype=np.uint8)
+            self._batch_scratch = np.empty((n, 160, 160, 3), dtype=np.float32)
+        crops = self._crop_scratch[:n]
+        batch = self._batch_scratch[:n]
+        # Same input the gallery was enrolled with: a plain INTER_AREA resize
+        # to 160x160, then DeepFace.represent(detector_backend="skip")'s own
+        # steps -- BGR->RGB and /255, no alignment, "base" normalization.
+        # Crops go into the reused buffer and the swap/scale is one pass
+        # straight into the NHWC batch
+        for i, face in enumerate(face_regions):
+            cv2.resize(face, (160, 160), dst=crops[i], interpolation=cv2.INTER_AREA)
+        np.multiply(crops[..., ::-1], np.float32(1.0 / 255), out=batch)
+        if self.embedder is not None:
+            return self.embedder.run(None, {self._embedder_input: batch})[0]
+
+        # Without ONNX, call DeepFace's Keras model directly; represent() would
+        # run it once per face. Same [0, 1] RGB input represent() feeds it
+        if self._keras_model is None:
+            client = self.DeepFace.build_model(self.model_name)
+            self._keras_model = getattr(client, "model", client)
+        return self._keras_model.predict(batch, verbose=0)
+
+    def _warm_connection(self, url):
+        """Open a pooled keep-alive connection before the first real request"""
+        try:
+            self._http.head(url, timeout=3)
+        except Exception as e:
+            print(f"[WARN] Connection warm-up failed: {e}")
+
     def l2_normalize(self, vec):
         vec = np.asarray(vec, dtype=np.float32)
         return vec / (np.linalg.norm(vec) + 1e-10)
-    
+
     def load_embeddings_from_backend(self):
-        """Load embeddings from deployed backend (no images)"""
+        """Load embeddings from deployed backend (no images)
+
+        The gallery is cached on disk; a 304 from the backend (or no
+        backend at all) maps the cached copy instead of re-downloading.
+        """
         try:
             if not self.device_id:
                 print("[ERROR] DEVICE_ID not set")
                 return
 
+            cached_etag = self._read_gallery_meta().get("etag")
+            headers = {"If-None-Match": cached_etag} if cached_etag else {}
+
             url = f"{self.base_url}/api/watchlist/device/{self.device_id}/embeddings"
-            resp = requests.get(url)
-            resp.raise_for_status()
-            data = resp.json()
-            self.embeddings = []
+            resp = self._http.get(url, headers=headers, timeout=5, stream=True)
+            if resp.status_code == 304:
+                if self._load_gallery_cache():
+                    print(f"[INFO] Gallery unchanged, using {len(self.gallery_names)} cached embeddings")
+                    resp = None
+                else:
+                    # The cached copy that ETag stood for is missing or
+                    # unreadable; fetch the full gallery instead
+                    print("[WARN] Gallery cache unusable, downloading it again")
+                    resp.close()
+                    resp = self._http.get(url, timeout=5, stream=True)
+            if resp is not None:
+                resp.raise_for_status()
+                if HAVE_IJSON:
+                    # Parse people one at a time off the (gzip-decoded) socket
+                    # instead of holding the whole JSON document in memory
+                    resp.raw.decode_content = True
+                    items = ijson.items(resp.raw, "embeddings.item", use_float=True)
+                else:
+                    items = resp.json().get("embeddings", [])
+                self.embeddings = []
 
-            for item in data.get("embeddings", []):
-                self.embeddings.append({
-                    "person_name": item["name"],
-                    "embedding": self.l2_normalize(item["embedding"])
-                })
+                for item in items:
+                    self.embeddings.append({
+                        "person_name": item["name"],
+                        # Normalized once, for the whole gallery, in _build_gallery_matrix
+                        "embedding": np.asarray(item["embedding"], dtype=np.float32)
+                    })
 
-            print(f"[INFO] Loaded {len(self.embeddings)} embeddings from backend")
+                self._build_gallery_matrix()
+                self._save_gallery_cache(resp.headers.get("ETag"))
+                print(f"[INFO] Loaded {len(self.embeddings)} embeddings from backend")
 
         except Exception as e:
             print("[ERROR] Failed to load embeddings:", e)
+            if self._load_gallery_cache():
+                print(f"[WARN] Using {len(self.gallery_names)} cached embeddings")
+
+        # Still on the loader thread: pay for the TensorFlow import here,
+        # not on the first face
+        if self.embedder is None:
+            self.DeepFace
+
+    def _gallery_cache_path(self, suffix):
+        """Cache file for this device's gallery, so devices sharing a cache dir don't mix"""
+        return os.path.join(GALLERY_CACHE_DIR, f"gallery_{self.device_id}{suffix}")
+
+    def _read_gallery_meta(self):
+        try:
+            with open(self._gallery_cache_path("_names.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load_gallery_cache(self):
+        """Map the cached gallery matrix read-only; False if there is none"""
+        meta = self._read_gallery_meta()
+        try:
+            matrix = np.load(self._gallery_cache_path(".npy"), mmap_mode="r")
+        except (OSError, ValueError):
+            return False
+        names = meta.get("names", [])
+        if len(names) != matrix.shape[0]:
+            return False
+
+        # No copy (the file stays mapped) when it was cached in GALLERY_DTYPE
+        self.gallery_matrix = _to_gallery_dtype(matrix)
+        self.gallery_names = names
+        self.embeddings = [{"person_name": n, "embedding": row} for n, row in zip(names, matrix)]
+        return True
+
+    def _save_gallery_cache(self, etag):
+        try:
+            os.makedirs(GALLERY_CACHE_DIR, exist_ok=True)
+            # Write then rename, so a mapped copy is never truncated under a reader
+            tmp = self._gallery_cache_path(".tmp.npy")
+            np.save(tmp, self.gallery_matrix)
+            os.replace(tmp, self._gallery_cache_path(".npy"))
+            with open(self._gallery_cache_path("_names.json"), "w") as f:
+                json.dump({"etag": etag, "names": self.gallery_names}, f)
+        except OSError as e:
+            print(f"[WARN] Could not cache gallery: {e}")
     
     
-    def recognize(self, frame):
-        """Recognize faces in frame"""
-        # First detect faces
-        faces = self.face_detector.detect(frame)
+    def _build_gallery_matrix(self):
+        """Stack the gallery embeddings into one contiguous, row-normalized matrix"""
+        if not self.embeddings:
+            self.gallery_matrix = np.empty((0, 0), dtype=np.float32)
+            self.gallery_names = []
+            return
+
+        matrix = np.vstack([entry["embedding"] for entry in self.embeddings]).astype(np.float32)
+        # Rows are normally unit length already; renormalizing is cheap at
+        # load time and keeps the matmul a pure cosine for any source
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-10
+        self.gallery_matrix = np.ascontiguousarray(_to_gallery_dtype(matrix))
+        self.gallery_names = [entry["person_name"] for entry in self.embeddings]
+
+    def recognize(self, frame, faces=None):
+        """Recognize faces in frame
+
+        Pass faces already detected on this frame to skip running the
+        detector again.
+        """
+        if faces is None:
+            faces = self.face_detector.detect(frame)
         
         if not faces:
             return False, {"reason": "no_faces_detected"}
         
-        # For each detected face, try recognition
-        recognized = False
-        best_match = None
-        best_confidence = 0
-        
+        # Crop every usable face first so the embedder sees them as one batch
+        crops = []
+        crop_faces = []
         for face in faces:
             startX, startY, endX, endY = face['box']
             
@@ -124,50 +511,30 @@ class Recognizer:
             if h < 30 or w < 30:
                 continue
 
-            face_region = cv2.resize(face_region, (160, 160), interpolation=cv2.INTER_AREA)
-            
-            try:
-                # Get embedding for face region
-                rep = self.DeepFace.represent(
-                    face_region,
-                    model_name=self.model_name,
-                    detector_backend="skip",
-                    enforce_detection=False,
-                    align=False
-                )
-
-                if not rep:
-                    continue
-
-                probe_emb = np.array(rep[0]["embedding"], dtype=np.float32)
-                
-                # Compare with gallery
-                for entry in self.embeddings:
-                    gallery_emb = entry['embedding']
-                    
-                    # Calculate cosine similarity
-                    a = np.array(probe_emb)
-                    b = np.array(gallery_emb)
-                    
-                    if a.size == 0 or b.size == 0:
-                        continue
-                    
-                    cos_sim = np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-10)
-                    
-                    if cos_sim > self.threshold and cos_sim > best_confidence:
-                        best_confidence = cos_sim
-                        best_match = {
-                            'name': entry['person_name'],
-                            'confidence': cos_sim,
-                            'box': face['box'],
-                            'distance': 1 - cos_sim,
-                            'source_image': entry['path']
-                        }
-                        recognized = True
-                        
-            except Exception as e:
-                print(f"[WARN] Face recognition error: {e}")
-                continue
+            crops.append(face_region)
+            crop_faces.append(face)
+
+        sims = self._score_batch(crops)
+        if sims is None:
+            return False, {"reason": "no_match", "faces_detected": len(faces)}
+
+        recognized = False
+        best_match = None
+        best_confidence = 0
+
+        for face, row in zip(crop_faces, sims):
+            i = int(row.argmax())
+            cos_sim = float(row[i])
+
+            if cos_sim > self.threshold and cos_sim > best_confidence:
+                best_confidence = cos_sim
+                best_match = {
+                    'name': self.gallery_names[i],
+                    'confidence': cos_sim,
+                    'box': face['box'],
+                    'distance': 1 - cos_sim
+                }
+                recognized = True
         
         if recognized and best_match:
             # Update recognized faces cache
@@ -184,56 +551,63 @@ class Recognizer:
         
         return False, {"reason": "no_match", "faces_detected": len(faces)}
 
-    def recognize_face(self, face_region):
-        """ Recognize a single cropped face image (160x160)"""
+    def _embed_probes(self, face_regions):
+        """(B, D) L2-normalized embeddings of the crops, or None"""
+        if not face_regions or not self.gallery_names:
+            return None
         try:
-            face_region = cv2.cvtColor(face_region, cv2.COLOR_BGR2RGB)
-            rep = self.DeepFace.represent(
-                face_region,
-                model_name=self.model_name,
-                detector_backend="skip",
-                enforce_detection=False,
-                align=True
-            )
-
-            if not rep:
-                return False, None
-            # probe_emb_raw = np.array(rep[0]["embedding"], dtype=np.float32)
-            probe_emb = self.l2_normalize(rep[0]["embedding"])
-            best_match = None
-            best_conf = 0.0
-
-            for entry in self.embeddings:
-                gallery_emb = entry["embedding"]
-                # Verify gallery embedding is normalized (optional debug)
-                gallery_norm = np.linalg.norm(gallery_emb)
-                if abs(gallery_norm - 1.0) > 0.01:
-                    print(f"[WARN] Gallery embedding not normalized: {gallery_norm}")
-
-                # cos_sim = np.dot(probe_emb, gallery_emb) / (
-                #     np.linalg.norm(probe_emb) * np.linalg.norm(gallery_emb) + 1e-10
-                # )
-                cos_sim = np.dot(probe_emb, gallery_emb)
-                print(f"[DEBUG] Similarity: {cos_sim:.4f}")
-
-                if cos_sim > self.threshold and cos_sim > best_conf:
-                    best_conf = cos_sim
-                    best_match = {
-                        "name": entry["person_name"],
-                        "confidence": cos_sim,
-                        #"source_image": entry["path"]
-                    }
-
-            if best_match:
-                return True, best_match
-
-            return False, None
-
+            probes = np.asarray(self._embed_batch(face_regions), dtype=np.float32)
         except Exception as e:
-            print("[WARN] Face recognition error:", e)
-            return False, None
+            print(f"[WARN] Face recognition error: {e}")
+            return None
+        if probes.shape[1] != self.gallery_matrix.shape[1]:
+            return None
+        probes /= np.linalg.norm(probes, axis=1, keepdims=True) + 1e-10
+        return probes
+
+    def _similarities(self, probes):
+        """(B, G) cosine similarities of normalized probes against the gallery"""
+        if HAVE_SIMSIMD:
+            probes = _to_gallery_dtype(probes)
+            dists = simsimd.cdist(probes, self.gallery_matrix, metric="cosine")
+            return 1.0 - np.asarray(dists, dtype=np.float32)
+        return probes @ self.gallery_matrix.T
+
+    def _score_batch(self, face_regions):
+        """(B, G) cosine similarities of each crop against the gallery, or None"""
+        probes = self._embed_probes(face_regions)
+        if probes is None:
+            return None
+        return self._similarities(probes)
+
+    def recognize_faces(self, face_regions):
+        """Recognize several BGR face crops (any size) in one batch
+
+        Returns (index into face_regions, info) for the best match above the
+        threshold, or (None, None).
+        """
+        probes = self._embed_probes(face_regions)
+        if probes is None:
+            return None, None
+
+        if (HAVE_NUMBA and not HAVE_SIMSIMD
+                and len(self.gallery_names) <= SMALL_GALLERY_ROWS):
+            # Small float32 gallery: the compiled loop beats a BLAS call, and
+            # stops at the first match above early_accept_threshold
+            b, i, cos_sim = _match_small(self.gallery_matrix, probes,
+                                         self.early_accept_threshold)
+        else:
+            sims = self._similarities(probes)
+            b, i = np.unravel_index(int(sims.argmax()), sims.shape)
+            cos_sim = sims[b, i]
+        cos_sim = float(cos_sim)
+        if cos_sim <= self.threshold:
+            return None, None
+        return int(b), {
+            "name": self.gallery_names[int(i)],
+            "confidence": cos_sim,
+        }
 
-    
     def get_recognized_faces(self):
         """Get currently recognized faces"""
         with self.recognition_lock:
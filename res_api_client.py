@@ -1,12 +1,98 @@
+import logging
+import logging.handlers
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
 import json
 import base64
 from datetime import datetime
+from urllib.parse import quote
+import socket
 import threading
-import time
 import queue
-import cv2
+from concurrent.futures import Future
+import time
 import numpy as np
+from jpeg_codec import encode_jpeg
+
+try:
+    import pybase64
+    HAVE_PYBASE64 = True
+except ImportError:
+    HAVE_PYBASE64 = False
+
+
+try:
+    import orjson
+    HAVE_ORJSON = True
+except ImportError:
+    HAVE_ORJSON = False
+
+
+def dumps_json(payload):
+    """Serialize a payload to JSON bytes, using orjson when installed"""
+    if HAVE_ORJSON:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode('utf-8')
+
+
+def b64encode_str(data):
+    """Base64-encode bytes to str, using SIMD pybase64 when installed"""
+    if HAVE_PYBASE64:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode('utf-8')
+
+
+# Hot loops log through a queue; a listener thread does the formatting and
+# the write to stderr so streaming and door monitoring never block on stdout
+log = logging.getLogger('apiclient')
+_log_queue = queue.Queue(-1)
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+log.addHandler(logging.handlers.QueueHandler(_log_queue))
+log.setLevel(logging.INFO)
+log.propagate = False
+
+
+# Low-priority statuses coalesced into /api/events batches; everything else,
+# including 'unrecognized' alerts, is posted immediately
+BATCHED_STATUSES = {'detecting', 'motion', 'idle'}
+
+# Batch endpoint answers meaning the backend doesn't have it at all
+BATCH_UNSUPPORTED = {404, 405, 501}
+
+
+# Consecutive failed door event subscriptions before switching to polling
+SSE_MAX_FAILURES = 3
+
+
+_iso_cache = [-1, '']
+
+
+def utc_now_iso():
+    """UTC ISO-8601 timestamp, formatted at most once per second"""
+    now = int(time.time())
+    if now != _iso_cache[0]:
+        _iso_cache[1] = datetime.utcfromtimestamp(now).isoformat()
+        _iso_cache[0] = now
+    return _iso_cache[1]
+
+
+class TunedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose sockets skip Nagle delays and get a larger send buffer"""
+
+    socket_options = HTTPConnection.default_socket_options + [
+        (socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20),
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    ]
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
+
 
 class APIClient:
     def __init__(self, base_url, device_id, device_name="Raspberry Pi"):
@@ -14,33 +100,80 @@ class APIClient:
         self.device_id = device_id
         self.device_name = device_name
         self.headers = {'Content-Type': 'application/json'}
+        self.frame_headers = {'Content-Type': 'image/jpeg'}
         self.stream_active = False
         self.door_state = 'locked'
         self.door_state_lock = threading.Lock()
         self.last_door_check = None
-        self.frame_queue = queue.Queue(maxsize=10)
+        # Single "latest wins" slot: streamers always send the newest frame
+        self._latest_frame_bytes = None
+        self._frame_slot_lock = threading.Lock()
+        self._frame_ready = threading.Event()
+        self.stream_thread = None
+        # Low-priority notifications are coalesced into /api/events batches
+        self._event_queue = queue.Queue()
+        self._event_thread = None
+        self._event_lock = threading.Lock()
+        self.batch_events = True
+        self.batch_max_items = 16
+        self.batch_max_wait = 0.1
+        # Extra attempts for a failed batch, always resent whole
+        self.batch_retries = 1
+
+        # One pooled session so every call reuses a keep-alive TCP/TLS connection
+        self.session = requests.Session()
+        adapter = TunedHTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=16,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Endpoint URLs are fixed for the lifetime of the client
+        self._call_url = f"{self.base_url}/api/notifications/call"
+        self._upload_url = f"{self.base_url}/api/images/upload-captured"
+        self._register_url = f"{self.base_url}/api/device/register"
+        self._notify_url = f"{self.base_url}/api/notifications/device"
+        self._door_url = f"{self.base_url}/api/door/state/device/{self.device_id}"
+        self._door_events_url = f"{self._door_url}/events"
+        self._stream_url = f"{self.base_url}/api/video/stream/{self.device_id}/frame"
+        self._batch_url = f"{self.base_url}/api/events"
+
+        # Send captures as a raw JPEG body until the backend says it only
+        # understands the base64 JSON upload
+        self.raw_uploads = True
         
         # Start background threads
         self.door_monitor_thread = threading.Thread(target=self._monitor_door_state, daemon=True)
-        self.stream_thread = threading.Thread(target=self._stream_frames, daemon=True)
+
+        # Pay the TCP/TLS handshake now rather than on the first doorbell event
+        threading.Thread(target=self._warm_connection, daemon=True).start()
         
         # Register device
         # self._register_device()
-    
+
+    def _warm_connection(self):
+        """Open a pooled keep-alive connection before the first real request"""
+        try:
+            self.session.head(self.base_url, timeout=3)
+        except Exception as e:
+            print(f"[WARN] Connection warm-up failed: {e}")
+
     def initiate_call(self):
         """Initiate a call to the owner through backend"""
         try:
             payload = {
                 'deviceId': self.device_id,
                 'deviceName': self.device_name,
-                'timestamp': datetime.utcnow().isoformat(),
+                'timestamp': utc_now_iso(),
                 'callType': 'doorbell_button'
             }
             
-            response = requests.post(
-                f"{self.base_url}/api/notifications/call",
+            response = self.session.post(
+                self._call_url,
                 headers=self.headers,
-                json=payload,
+                data=dumps_json(payload),
                 timeout=10
             )
             
@@ -59,23 +192,44 @@ class APIClient:
     def upload_captured_face(self, image_bytes, filename, person_name="Unknown", status="unrecognized"):
         """Upload captured face to backend for Supabase storage"""
         try:
-            image_b64 = base64.b64encode(image_bytes).decode('utf-8')
-            
-            payload = {
-                'deviceId': self.device_id,
-                'imageData': image_b64,
-                'filename': filename,
-                'personName': person_name,
-                'status': status,
-                'bucket': 'captured-faces',
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/api/images/upload-captured",
-                headers=self.headers,
-                json=payload,
-            )
+            response = None
+            if self.raw_uploads:
+                response = self.session.post(
+                    self._upload_url,
+                    headers={
+                        'Content-Type': 'image/jpeg',
+                        'X-Device-Id': self.device_id,
+                        'X-Filename': quote(filename),
+                        'X-Person-Name': quote(person_name),
+                        'X-Status': status,
+                        'X-Bucket': 'captured-faces',
+                        'X-Timestamp': utc_now_iso()
+                    },
+                    data=image_bytes,
+                )
+                if response.status_code in (400, 415):
+                    print("[WARN] Raw image upload rejected, using base64 JSON upload")
+                    self.raw_uploads = False
+                    response = None
+
+            if response is None:
+                image_b64 = b64encode_str(image_bytes)
+
+                payload = {
+                    'deviceId': self.device_id,
+                    'imageData': image_b64,
+                    'filename': filename,
+                    'personName': person_name,
+                    'status': status,
+                    'bucket': 'captured-faces',
+                    'timestamp': utc_now_iso()
+                }
+
+                response = self.session.post(
+                    self._upload_url,
+                    headers=self.headers,
+                    data=dumps_json(payload),
+                )
             
             if response.status_code == 200:
                 data = response.json()
@@ -95,13 +249,13 @@ class APIClient:
             payload = {
                 'deviceId': self.device_id,
                 'deviceName': self.device_name,
-                'timestamp': datetime.utcnow().isoformat()
+                'timestamp': utc_now_iso()
             }
             
-            response = requests.post(
-                f"{self.base_url}/api/device/register",
+            response = self.session.post(
+                self._register_url,
                 headers=self.headers,
-                json=payload,
+                data=dumps_json(payload),
                 timeout=5
             )
             
@@ -113,132 +267,265 @@ class APIClient:
         except Exception as e:
             print(f"[ERROR] Device registration error: {e}")
     
+    def _set_door_state(self, new_state):
+        with self.door_state_lock:
+            if new_state != self.door_state:
+                log.info("Door state changed: %s -> %s", self.door_state, new_state)
+                self.door_state = new_state
+
+        self.last_door_check = datetime.utcnow()
+
     def _monitor_door_state(self):
-        """Background thread to monitor door state changes (robust)"""
+        """Background thread following door state via server-sent events"""
+        backoff = 1.0
+        failures = 0
+
+        while failures < SSE_MAX_FAILURES:
+            try:
+                with self.session.get(
+                    self._door_events_url,
+                    headers={'Accept': 'text/event-stream'},
+                    stream=True,
+                    timeout=(5, 60)
+                ) as response:
+                    if response.status_code != 200:
+                        failures += 1
+                        log.warning("Door state subscription failed: %s (%d/%d)",
+                                    response.status_code, failures, SSE_MAX_FAILURES)
+                    else:
+                        backoff = 1.0
+                        failures = 0
+                        for line in response.iter_lines(decode_unicode=True):
+                            # Ignore keep-alive comments and non-data fields
+                            if not line or not line.startswith('data:'):
+                                continue
+                            data = json.loads(line[5:])
+                            self._set_door_state(data.get('state', 'locked'))
+
+            except Exception as e:
+                failures += 1
+                log.error("Door state subscription error: %s (%d/%d)",
+                          e, failures, SSE_MAX_FAILURES)
+
+            if failures < SSE_MAX_FAILURES:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+        log.warning("Door state events unavailable, falling back to polling")
+        self._poll_door_state()
+
+    def _poll_door_state(self):
+        """Poll door state for backends without a working event stream"""
         check_interval = 3.0
         max_failures = 5
         failures = 0
 
         while True:
             try:
-                response = requests.get(
-                    f"{self.base_url}/api/door/state/device/{self.device_id}",
+                response = self.session.get(
+                    self._door_url,
                     timeout=5
                 )
 
                 if response.status_code == 200:
                     data = response.json()
-                    new_state = data.get('state', 'locked')
-
-                    with self.door_state_lock:
-                        if new_state != self.door_state:
-                            print(f"[INFO] Door state changed: {self.door_state} -> {new_state}")
-                            self.door_state = new_state
-
-                    self.last_door_check = datetime.utcnow()
+                    self._set_door_state(data.get('state', 'locked'))
                     failures = 0
                 else:
-                    print(f"[WARN] Door state fetch failed: {response.status_code}")
+                    log.warning("Door state fetch failed: %s", response.status_code)
 
             except requests.exceptions.Timeout:
                 failures += 1
-                print(f"[WARN] Door state timeout ({failures}/{max_failures})")
+                log.warning("Door state timeout (%d/%d)", failures, max_failures)
 
             except Exception as e:
                 failures += 1
-                print(f"[ERROR] Door state monitoring error: {e}")
+                log.error("Door state monitoring error: %s", e)
 
             if failures >= max_failures:
-                print("[WARN] Door state monitoring paused (network unstable)")
+                log.warning("Door state monitoring paused (network unstable)")
                 time.sleep(10)
                 failures = 0
             else:
                 time.sleep(check_interval)
     
     def _stream_frames(self):
-        stream_url = f"{self.base_url}/api/video/stream/{self.device_id}/frame"
         failures = 0
 
         while self.stream_active:
             try:
-                if self.frame_queue.empty():
-                    time.sleep(0.05)
+                if not self._frame_ready.wait(timeout=0.05):
                     continue
 
-                frame_bytes = self.frame_queue.get_nowait()
-                files = {'frame': ('frame.jpg', frame_bytes, 'image/jpeg')}
+                with self._frame_slot_lock:
+                    frame_bytes = self._latest_frame_bytes
+                    self._latest_frame_bytes = None
+                    self._frame_ready.clear()
+
+                if frame_bytes is None:
+                    continue
 
-                response = requests.post(
-                    stream_url,
-                    files=files,
+                # Raw JPEG body: no multipart boundary or extra copy per frame
+                response = self.session.post(
+                    self._stream_url,
+                    data=frame_bytes,
+                    headers=self.frame_headers,
                     timeout=7
                 )
 
                 if response.status_code != 200:
                     failures += 1
-                    print(f"[WARN] Frame upload failed: {response.status_code}")
+                    log.warning("Frame upload failed: %s", response.status_code)
                 else:
                     failures = 0
 
             except requests.exceptions.Timeout:
                 failures += 1
-                print("[WARN] Streaming timeout")
+                log.warning("Streaming timeout")
 
             except Exception as e:
                 failures += 1
-                print(f"[ERROR] Streaming error: {e}")
+                log.error("Streaming error: %s", e)
 
             if failures >= 5:
-                print("[WARN] Streaming paused due to network instability")
+                log.warning("Streaming paused due to network instability")
                 time.sleep(5)
                 failures = 0
     
-    def send_notification(self, status, image_data=None, image_url=None, confidence=None, person_name=None):
-        """Send notification to backend"""
+    def send_notification(self, status, image_data=None, image_url=None, confidence=None, person_name=None,
+                          image_bytes=None):
+        """Send notification to backend; True once the backend has accepted it
+
+        Pass already-encoded JPEG bytes as image_bytes to skip re-encoding a frame.
+        BATCHED_STATUSES don't wait for their batch: they return a Future that
+        resolves to the delivery status (use .result(timeout=...) if needed).
+        """
         try:
             payload = {
                 'deviceId': self.device_id,
                 'status': status,
-                'timestamp': datetime.utcnow().isoformat(),
+                'timestamp': utc_now_iso(),
                 'confidence': confidence,
                 'personName': person_name
             }
             
             if image_url:
                 payload['imageUrl'] = image_url
-            elif image_data:
+            elif image_bytes is not None:
+                payload['imageData'] = b64encode_str(image_bytes)
+            elif isinstance(image_data, np.ndarray):
                 # Convert numpy array to bytes
-                if isinstance(image_data, np.ndarray):
-                    _, buffer = cv2.imencode('.jpg', image_data)
-                    image_bytes = buffer.tobytes()
-                    payload['imageData'] = base64.b64encode(image_bytes).decode('utf-8')
-            
-            response = requests.post(
-                f"{self.base_url}/api/notifications/device",
+                image_bytes = encode_jpeg(image_data, quality=80)
+                payload['imageData'] = b64encode_str(image_bytes)
+
+            if self.batch_events and status in BATCHED_STATUSES:
+                return self._enqueue_event(payload)
+
+            return self._post_notification(payload)
+                
+        except Exception as e:
+            print(f"[ERROR] Failed to send notification: {e}")
+            return False
+
+    def _post_notification(self, payload):
+        try:
+            response = self.session.post(
+                self._notify_url,
                 headers=self.headers,
-                json=payload,
+                data=dumps_json(payload),
             )
-            
+
             if response.status_code == 200:
-                print(f"[INFO] Notification sent: {status}")
+                print(f"[INFO] Notification sent: {payload['status']}")
                 return True
             else:
                 print(f"[ERROR] Notification failed: {response.status_code}")
                 return False
-                
+
         except Exception as e:
             print(f"[ERROR] Failed to send notification: {e}")
             return False
+
+    def _enqueue_event(self, payload):
+        """Queue payload for the next batch; the Future resolves to its delivery status"""
+        with self._event_lock:
+            if self._event_thread is None:
+                self._event_thread = threading.Thread(target=self._flush_events, daemon=True)
+                self._event_thread.start()
+
+        future = Future()
+        self._event_queue.put((payload, future))
+        return future
+
+    def _post_batch(self, payloads):
+        """POST payloads as one /api/events batch, retrying it whole
+
+        Returns the final HTTP status, or None if no response ever came back
+        (the backend may or may not have taken the batch).
+        """
+        status = None
+        for _ in range(1 + self.batch_retries):
+            try:
+                response = self.session.post(
+                    self._batch_url,
+                    headers=self.headers,
+                    data=dumps_json({'events': payloads}),
+                    timeout=10
+                )
+            except Exception as e:
+                log.error("Notification batch error: %s", e)
+                status = None
+                continue
+            status = response.status_code
+            if status < 500:
+                break
+            log.warning("Notification batch failed: %s", status)
+        return status
+
+    def _flush_events(self):
+        """Background thread posting queued notifications in batches"""
+        while True:
+            events = [self._event_queue.get()]
+            deadline = time.monotonic() + self.batch_max_wait
+            while len(events) < self.batch_max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    events.append(self._event_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            payloads = [payload for payload, _ in events]
+            status = self._post_batch(payloads) if self.batch_events else 0
+            if status is not None and 200 <= status < 300:
+                log.info("Sent %d batched notifications", len(payloads))
+                for _, future in events:
+                    future.set_result(True)
+            elif status is None:
+                # No answer: the batch may have landed, so it is not reposted
+                for _, future in events:
+                    future.set_result(False)
+            else:
+                # The backend answered and refused the batch, so nothing in it
+                # was accepted; send the events one by one instead
+                if status in BATCH_UNSUPPORTED:
+                    log.warning("Batch endpoint unavailable, sending notifications individually")
+                    self.batch_events = False
+                elif status:
+                    log.warning("Notification batch rejected (%s), sending individually", status)
+                for payload, future in events:
+                    future.set_result(self._post_notification(payload))
     
     def start_streaming(self):
         if self.stream_active:
             return
 
         self.stream_active = True
-        self.stream_thread = threading.Thread(
-            target=self._stream_frames,
-            daemon=True
-        )
+        # One sender, one upload in flight: frames reach the backend in
+        # capture order, and anything captured meanwhile is replaced by the
+        # newest frame in the slot
+        self.stream_thread = threading.Thread(target=self._stream_frames, daemon=True)
         self.stream_thread.start()
 
         print(f"[INFO] Started streaming to {self.base_url}")
@@ -246,8 +533,9 @@ class APIClient:
     def stop_streaming(self):
         """Stop streaming"""
         self.stream_active = False
-        if self.stream_thread.is_alive():
+        if self.stream_thread and self.stream_thread.is_alive():
             self.stream_thread.join(timeout=2)
+        self.stream_thread = None
         print("[INFO] Stopped streaming")
     
     def queue_frame(self, frame):
@@ -257,17 +545,12 @@ class APIClient:
         
         # Convert frame to JPEG bytes
         if isinstance(frame, np.ndarray):
-            _, buffer = cv2.imencode('.jpg', frame)
-            frame_bytes = buffer.tobytes()
-            
-            # Add to queue, drop old frames if queue is full
-            if self.frame_queue.full():
-                try:
-                    self.frame_queue.get_nowait()
-                except queue.Empty:
-                    pass
+            frame_bytes = encode_jpeg(frame, quality=80)
             
-            self.frame_queue.put(frame_bytes)
+            # Overwrite any frame the sender has not picked up yet
+            with self._frame_slot_lock:
+                self._latest_frame_bytes = frame_bytes
+                self._frame_ready.set()
             return True
         
         return False
@@ -281,10 +564,10 @@ class APIClient:
         """Update door state on backend"""
         try:
             payload = {'state': state}
-            response = requests.put(
-                f"{self.base_url}/api/door/state/device/{self.device_id}",
+            response = self.session.put(
+                self._door_url,
                 headers=self.headers,
-                json=payload,
+                data=dumps_json(payload),
                 timeout=5
             )
             
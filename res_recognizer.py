@@ -5,11 +5,15 @@ from typing import List, Dict, Tuple
 import threading
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Parallel gallery image downloads; decoding and embedding stay on one thread
+GALLERY_DOWNLOAD_WORKERS = 8
+
 class FaceDetector:
     def __init__(self, prototxt_path="models/deploy.prototxt", 
                  model_path="models/res10_300x300_ssd_iter_140000.caffemodel"):
@@ -19,37 +23,26 @@ class FaceDetector:
     def detect(self, frame):
         """Detect faces in frame using DNN"""
         (h, w) = frame.shape[:2]
-        blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 1.0,
-                                     (300, 300), (104.0, 177.0, 123.0))
+        # blobFromImage resizes, subtracts the mean and transposes in one pass
+        blob = cv2.dnn.blobFromImage(frame, 1.0, (300, 300), (104.0, 177.0, 123.0),
+                                     swapRB=False, crop=False)
         
         self.net.setInput(blob)
         detections = self.net.forward()
         
-        faces = []
-        for i in range(0, detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
-            
-            if confidence > self.confidence_threshold:
-                box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                (startX, startY, endX, endY) = box.astype("int")
-                
-                # Ensure bounding boxes fall within the dimensions of the frame
-                startX = max(0, startX)
-                startY = max(0, startY)
-                endX = min(w, endX)
-                endY = min(h, endY)
-                
-                faces.append({
-                    'box': (startX, startY, endX, endY),
-                    'confidence': confidence
-                })
+        # Confidence filter and clamp for all detections at once
+        det = detections[0, 0]
+        keep = det[:, 2] > self.confidence_threshold
+        limits = np.array([w, h, w, h])
+        boxes = np.clip((det[keep, 3:7] * limits).astype(np.int32), 0, limits)
+        faces = [{'box': tuple(box), 'confidence': conf}
+                 for box, conf in zip(boxes.tolist(), det[keep, 2].tolist())]
         
         return faces
 
 class Recognizer:
     def __init__(self, model_name: str = 'Facenet', detector_backend: str = 'opencv', threshold: float = 0.40, base_url = None):
         import os
-        from deepface import DeepFace
         
         SUPABASE_URL = os.getenv('SUPABASE_URL')
         SUPABASE_KEY = os.getenv('SUPABASE_KEY')
@@ -62,9 +55,23 @@ class Recognizer:
         self.model_name = model_name
         self.detector_backend = detector_backend
         self.threshold = threshold
-        self.DeepFace = DeepFace
+        # A face matched this confidently ends the search; the remaining
+        # faces in the frame are not embedded
+        self.early_accept_threshold = 0.85
+        # deepface pulls in TensorFlow; imported on first use
+        self._deepface = None
         self.embeddings = []
+        # (N, D) L2-normalized gallery rows with parallel name/path lists
+        self.gallery_matrix = np.empty((0, 0), dtype=np.float32)
+        self.gallery_names = []
+        self.gallery_paths = []
         self.base_url = base_url
+        # One keep-alive session for every gallery/embedding download
+        self._http = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16)
+        self._http.mount("https://", adapter)
+        self._http.mount("http://", adapter)
+        threading.Thread(target=self._warm_connection, args=(SUPABASE_URL,), daemon=True).start()
         
         # Initialize face detector
         self.face_detector = FaceDetector()
@@ -78,7 +85,15 @@ class Recognizer:
         if not self.device_id:
             print("[WARN] DEVICE_ID not set. Will load all images from bucket.")
 
-    
+
+    @property
+    def DeepFace(self):
+        """The deepface module, imported (with TensorFlow) on first use"""
+        if self._deepface is None:
+            from deepface import DeepFace
+            self._deepface = DeepFace
+        return self._deepface
+
     def build_gallery_from_device(self):
         """Build face recognition gallery from Supabase images bucket for this device"""
         try:
@@ -95,39 +110,41 @@ class Recognizer:
             
             self.embeddings = []
             image_count = 0
-            
+
+            paths = []
             for obj in items:
                 path = obj.get('name')
                 path = self.device_id + '/' + path
-                print(f"[DEBUG] Processing image: {path}")
                 
                 # Skip if not in device folder (when device_id is not set)
                 if self.device_id and not path.startswith(f"{self.device_id}/"):
                     continue
-                
-                try:
-                    # Get signed URL for the image
-                    print("[DEBUG] Getting signed URL")
-                    signed = self.sup.storage.from_('images').create_signed_url(path, 3600)
-                    url = signed.get('signed_url') or signed.get('signedURL')
-                    
-                    if not url:
-                        print(f"[WARN] No URL for {path}")
+                paths.append(path)
+
+            signed_urls = self._sign_urls(paths)
+
+            # Downloads run on a pool over the keep-alive session; embeddings are
+            # extracted here as each download finishes, overlapping the rest
+            with ThreadPoolExecutor(max_workers=GALLERY_DOWNLOAD_WORKERS) as executor:
+                downloads = executor.map(
+                    lambda path: self._download_image(path, signed_urls.get(path)),
+                    paths)
+
+                for path, url, img_bytes in downloads:
+                    if img_bytes is None:
                         continue
-                    
-                    # Download image
-                    resp = requests.get(url)
-                    resp.raise_for_status()
-                    img_bytes = resp.content
+
+                    print(f"[DEBUG] Processing image: {path}")
                     
                     # Convert bytes to numpy array
                     nparr = np.frombuffer(img_bytes, np.uint8)
                     img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                    img = cv2.resize(img, (640, 640), interpolation=cv2.INTER_AREA)
                     
                     if img is None:
                         print(f"[WARN] Failed to decode image: {path}")
                         continue
+
+                    img = cv2.resize(img, (640, 640), interpolation=cv2.INTER_AREA)
                     
                     # Extract embedding
                     try:
@@ -171,11 +188,8 @@ class Recognizer:
                     except Exception as e:
                         print(f"[WARN] Failed to extract embedding from {path}: {e}")
                         continue
-                        
-                except Exception as e:
-                    print(f"[WARN] Failed to process {path}: {e}")
-                    continue
             
+            self._build_gallery_matrix()
             print(f"[INFO] Gallery built with {image_count} embeddings")
             
             if image_count == 0:
@@ -186,6 +200,48 @@ class Recognizer:
             import traceback
             traceback.print_exc()
     
+    def _warm_connection(self, url):
+        """Open a pooled keep-alive connection before the first real request"""
+        try:
+            self._http.head(url, timeout=3)
+        except Exception as e:
+            print(f"[WARN] Connection warm-up failed: {e}")
+
+    def _sign_urls(self, paths):
+        """Signed URLs for all paths in one request; missing entries are signed per download"""
+        if not paths:
+            return {}
+        try:
+            signed = self.sup.storage.from_('images').create_signed_urls(paths, 3600)
+        except Exception as e:
+            print(f"[WARN] Batch URL signing failed, signing per image: {e}")
+            return {}
+
+        urls = {}
+        for entry in signed:
+            url = entry.get('signedURL') or entry.get('signedUrl') or entry.get('signed_url')
+            if entry.get('path') and url:
+                urls[entry['path']] = url
+        return urls
+
+    def _download_image(self, path, url=None):
+        """(path, url, bytes) for one gallery image; bytes is None on failure"""
+        try:
+            if not url:
+                signed = self.sup.storage.from_('images').create_signed_url(path, 3600)
+                url = signed.get('signed_url') or signed.get('signedURL')
+            
+            if not url:
+                print(f"[WARN] No URL for {path}")
+                return path, None, None
+            
+            resp = self._http.get(url, timeout=5)
+            resp.raise_for_status()
+            return path, url, resp.content
+        except Exception as e:
+            print(f"[WARN] Failed to process {path}: {e}")
+            return path, url, None
+
     def load_embeddings_from_backend(self):
         """Load embeddings from deployed backend (no images)"""
         try:
@@ -195,7 +251,7 @@ class Recognizer:
 
             url = f"{self.base_url}/api/watchlist/device/{self.device_id}/embeddings"
 
-            resp = requests.get(url)
+            resp = self._http.get(url, timeout=5)
             resp.raise_for_status()
 
             data = resp.json()
@@ -207,15 +263,34 @@ class Recognizer:
                     "embedding": np.array(item["embedding"], dtype=np.float32)
                 })
 
+            self._build_gallery_matrix()
             print(f"[INFO] Loaded {len(self.embeddings)} embeddings from backend")
 
         except Exception as e:
             print("[ERROR] Failed to load embeddings:", e)
     
-    def recognize(self, frame):
-        """Recognize faces in frame"""
-        # First detect faces
-        faces = self.face_detector.detect(frame)
+    def _build_gallery_matrix(self):
+        """Stack gallery embeddings into one contiguous, row-normalized matrix"""
+        if not self.embeddings:
+            self.gallery_matrix = np.empty((0, 0), dtype=np.float32)
+            self.gallery_names = []
+            self.gallery_paths = []
+            return
+
+        matrix = np.vstack([entry['embedding'] for entry in self.embeddings]).astype(np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-10
+        self.gallery_matrix = np.ascontiguousarray(matrix)
+        self.gallery_names = [entry['person_name'] for entry in self.embeddings]
+        self.gallery_paths = [entry.get('path', '') for entry in self.embeddings]
+
+    def recognize(self, frame, faces=None):
+        """Recognize faces in frame
+
+        Pass faces already detected on this frame to skip running the
+        detector again.
+        """
+        if faces is None:
+            faces = self.face_detector.detect(frame)
         
         if not faces:
             return False, {"reason": "no_faces_detected"}
@@ -244,29 +319,30 @@ class Recognizer:
                     align=True
                 )
                 
-                # Compare with gallery
-                for entry in self.embeddings:
-                    gallery_emb = entry['embedding']
-                    
-                    # Calculate cosine similarity
-                    a = np.array(probe_emb)
-                    b = np.array(gallery_emb)
-                    
-                    if a.size == 0 or b.size == 0:
-                        continue
-                    
-                    cos_sim = np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-10)
-                    
-                    if cos_sim > self.threshold and cos_sim > best_confidence:
-                        best_confidence = cos_sim
-                        best_match = {
-                            'name': entry['person_name'],
-                            'confidence': cos_sim,
-                            'box': face['box'],
-                            'distance': 1 - cos_sim,
-                            'source_image': entry['path']
-                        }
-                        recognized = True
+                if not probe_emb or not self.gallery_names:
+                    continue
+                
+                # Cosine similarity against the whole gallery in one GEMV
+                p = np.asarray(probe_emb[0]["embedding"], dtype=np.float32)
+                if p.shape[0] != self.gallery_matrix.shape[1]:
+                    continue
+                p /= np.linalg.norm(p) + 1e-10
+                sims = self.gallery_matrix @ p
+                idx = int(sims.argmax())
+                cos_sim = float(sims[idx])
+                
+                if cos_sim > self.threshold and cos_sim > best_confidence:
+                    best_confidence = cos_sim
+                    best_match = {
+                        'name': self.gallery_names[idx],
+                        'confidence': cos_sim,
+                        'box': face['box'],
+                        'distance': 1 - cos_sim,
+                        'source_image': self.gallery_paths[idx]
+                    }
+                    recognized = True
+                    if cos_sim >= self.early_accept_threshold:
+                        break
                         
             except Exception as e:
                 print(f"[WARN] Face recognition error: {e}")
@@ -1,4 +1,4 @@
-import base64, json, time
+import base64, json
 from cryptography.fernet import Fernet, InvalidToken
 import os
 from dotenv import load_dotenv
@@ -6,21 +6,19 @@ from dotenv import load_dotenv
 load_dotenv()
 
 SECRET = os.getenv("DOOR_SECRET_KEY")
-print("Loaded SECRET:", SECRET)
 
 fernet = Fernet(SECRET.encode())
 
-def decrypt_request(ciphertext: str):
-    try:
-        decrypted = fernet.decrypt(ciphertext.encode(), ttl=10)
-        payload = json.loads(decrypted)
-        print("Decrypted payload:", payload)
-        # Anti-replay
-        now = int(time.time())
-        if abs(now - payload["timestamp"]) > 10:
-            raise ValueError("Expired request")
+# Tokens older than this are rejected by Fernet itself (anti-replay)
+TOKEN_TTL = 10
 
-        return payload
+def decrypt_request(ciphertext):
+    """Decrypt a door-control token (str or bytes); None if invalid or expired"""
+    try:
+        # Fernet takes str or bytes and checks the token's own timestamp
+        # against the ttl, so no separate payload timestamp check is needed
+        decrypted = fernet.decrypt(ciphertext, ttl=TOKEN_TTL)
+        return json.loads(decrypted)
 
     except (InvalidToken, ValueError) as e:
         return None
@@ -1,19 +1,51 @@
+import os
+# Worker threads for OpenCV and the BLAS/OpenMP pools. Two leaves the other
+# cores to capture, Flask/SocketIO and linphone instead of oversubscribing
+COMPUTE_THREADS = 2
+# OpenMP/BLAS read these when they load, so they have to be set before
+# numpy, OpenCV or TensorFlow are imported
+os.environ.setdefault("OMP_NUM_THREADS", str(COMPUTE_THREADS))
+os.environ.setdefault("OPENBLAS_NUM_THREADS", str(COMPUTE_THREADS))
+
 import threading
 import time
 import cv2
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, Response, jsonify, request, render_template
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
-from camera import Camera
+from camera import Camera, MotionGate, crop_face_regions, draw_face_annotations
+from jpeg_codec import STREAM_JPEG_QUALITY, encode_jpeg, mjpeg_part
 from security import decrypt_request
 from recognizer import Recognizer
 from hardware import Button, Relay, Buzzer
 from api_client import api_client
-import os
 from datetime import datetime
 from linphone_controller import LinphoneController
 from launch_browser import start_chromium
 
+cv2.setNumThreads(COMPUTE_THREADS)
+cv2.setUseOptimized(True)
+# Stock Pi OS has no usable OpenCL for the VideoCore, so OpenCV's T-API is
+# opt-in (USE_OPENCL=1, e.g. with a VC4 Gallium/rusticl driver or on a dev host)
+USE_OPENCL = os.getenv("USE_OPENCL") == "1" and cv2.ocl.haveOpenCL()
+cv2.ocl.setUseOpenCL(USE_OPENCL)
+if USE_OPENCL:
+    print(f"[INFO] OpenCV OpenCL device: {cv2.ocl.Device.getDefault().name()}")
+
+# Run the DNN face detector on every Nth frame and carry its boxes forward
+DETECT_EVERY = 4
+
+# Event uploads queued or running at once; past this new ones are dropped
+# rather than piling up behind a slow network
+UPLOAD_BACKLOG = 4
+
+# An identical status update is re-sent at most this often (seconds)
+STATUS_REPEAT_INTERVAL = 1.0
+
+# How long a recognition result keeps labelling the matching box on the stream
+RECOGNIZED_OVERLAY_TTL = 1.0
+
 # Flask app with SocketIO for real-time updates
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
@@ -35,10 +67,11 @@ class DeviceServiceLocal:
         self.base_url = base_url if base_url else os.getenv("BACKEND_URL")
 
         print("[INFO] Initializing Camera...")
-        self.camera = Camera(resolution=(640, 480), framerate=15)
+        self.camera = Camera(resolution=(640, 480), framerate=15, hw_jpeg=True)
         
         print("[INFO] Loading Face Recognition...")
-        self.recognizer = Recognizer(threshold=0.60, base_url=self.base_url)
+        self.recognizer = Recognizer(threshold=0.60, base_url=self.base_url,
+                                     embedder_threads=COMPUTE_THREADS)
         self.face_detector = self.recognizer.face_detector
 
         print("[INFO] Initializing Hardware...")
@@ -55,10 +88,34 @@ class DeviceServiceLocal:
         self.last_recognition_time = 0
         self.recognition_cooldown = 3
         self.system_status = "initializing"
-
-        # MJPEG frame
-        self.latest_frame = None
-        self.frame_lock = threading.Lock()
+        # Door sequences finish on a timer so the frame loop never sleeps;
+        # new events are skipped while one is in progress
+        self._door_timer = None
+        self._door_busy = False
+        # Event photo encode + upload runs off the frame/recognition threads
+        self._upload_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="upload")
+        self._upload_slots = threading.BoundedSemaphore(UPLOAD_BACKLOG)
+
+        # MJPEG frame: encoded once per processed frame and shared by all viewers
+        self._latest_part = b''
+        self._jpeg_version = 0
+        self._mjpeg_clients = 0
+        self.frame_cond = threading.Condition()
+        # Newest annotated frame waiting for the encode thread (newest wins)
+        self._encode_frame = None
+        self._encode_cond = threading.Condition()
+        # Newest (frame, faces) waiting for the recognition worker; a fresher
+        # frame simply replaces one that hasn't been picked up yet
+        self._pending = None
+        self._pending_cv = threading.Condition()
+        # (box, info, monotonic time) of the last recognized face, drawn on the stream
+        self._last_recognized = None
+        # (state, message, door_locked, extras) and monotonic time of the last emit
+        self._last_emit = (None, 0.0)
+        self._frame_idx = 0
+        self._last_faces = []
+        # Detection is skipped while the scene is static
+        self._motion = MotionGate(self.camera)
 
         print("[INFO] Connecting to Server...")
         self._init_api_client()
@@ -83,12 +140,24 @@ class DeviceServiceLocal:
         api_client = init_api_client(self.base_url, self.device_id, "Smart Doorbell")
 
     def _emit_status(self, state, message, **kwargs):
-        """Emit status update to web UI via SocketIO"""
+        """Emit status update to web UI via SocketIO
+
+        Repeats of the last update within STATUS_REPEAT_INTERVAL are dropped,
+        so per-frame callers only reach the clients on a change.
+        """
+        door_locked = kwargs.get("door_locked", self.local_door_state == "locked")
+        key = (state, message, door_locked, kwargs)
+        now = time.monotonic()
+        last_key, last_time = self._last_emit
+        if key == last_key and now - last_time < STATUS_REPEAT_INTERVAL:
+            return
+        self._last_emit = (key, now)
+
         data = {
             "state": state,
             "message": message,
-            "door_locked": kwargs.get("door_locked", self.local_door_state == "locked"),
-            "timestamp": datetime.now().strftime("%H:%M:%S"),
+            "door_locked": door_locked,
+            "timestamp": time.strftime("%H:%M:%S"),
             **kwargs
         }
         socketio.emit('status_update', data)
@@ -103,65 +172,66 @@ class DeviceServiceLocal:
         self._emit_status("idle", "Monitoring for faces", door_locked=True)
 
         def loop():
+            frame_id = 0
             while True:
-                frame = self.camera.read()
+                # Woken by the capture thread as each frame lands
+                frame, frame_id = self.camera.wait_for_next(frame_id)
                 if frame is None:
-                    time.sleep(0.05)
                     continue
 
-                faces = self.face_detector.detect(frame)
-                processed_frame = frame.copy()
-                recognized_info = None
+                # Face detection; in-between frames reuse the last boxes
+                fresh = self._frame_idx % DETECT_EVERY == 0
+                self._frame_idx += 1
+                if fresh:
+                    self._last_faces = self._detect(frame)
+                faces = self._last_faces
                 face_detected = len(faces) > 0
 
                 if face_detected and not self.processing:
                     self._emit_status("detecting", "Face detected - Analyzing...")
 
-                for face in faces:
-                    startX, startY, endX, endY = face["box"]
-                    confidence = face["confidence"]
-                    
-                    color = (0, 255, 0)
-                    y = startY - 10 if startY - 10 > 10 else startY + 10
-                    cv2.rectangle(processed_frame, (startX, startY), (endX, endY), color, 2)
-                    cv2.putText(processed_frame, f"Face {confidence*100:.1f}%", (startX, y),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 2)
-
-                    margin = 0.25
-                    h, w = frame.shape[:2]
-                    dx = int((endX - startX) * margin)
-                    dy = int((endY - startY) * margin)
-                    x1 = max(0, startX - dx)
-                    y1 = max(0, startY - dy)
-                    x2 = min(w, endX + dx)
-                    y2 = min(h, endY + dy)
-                    face_region = frame[y1:y2, x1:x2]
-
-                    if face_region is None or face_region.size == 0:
-                        continue
-                    h, w = face_region.shape[:2]
-                    if h < 30 or w < 30:
-                        continue
+                # Frames without boxes go out as the camera's hardware JPEG;
+                # the rest are annotated and handed to the encode thread.
+                # Nobody watching means nothing to copy, draw or encode
+                if self._mjpeg_clients > 0:
+                    hw_jpeg = None if faces else self.camera.read_jpeg()
+                    if hw_jpeg is not None:
+                        self._publish_jpeg(hw_jpeg)
+                    else:
+                        annotated = self._annotate(frame, faces)
+                        with self._encode_cond:
+                            self._encode_frame = annotated
+                            self._encode_cond.notify()
+
+                if faces and fresh:
+                    with self._pending_cv:
+                        self._pending = (frame, faces)
+                        self._pending_cv.notify()
+                elif not faces and not self.processing:
+                    if self.system_status != "idle":
+                        self.system_status = "idle"
+                        self._emit_status("idle", "Monitoring for faces", 
+                                        door_locked=(self.local_door_state == "locked"))
 
-                    face_region = cv2.resize(face_region, (160, 160), interpolation=cv2.INTER_AREA)
-                    recognized, info = self.recognizer.recognize_face(face_region)
-
-                    if recognized:
-                        name = info.get("name", "Recognized")
-                        rec_conf = info.get("confidence", 0)
-                        color = (0, 255, 255)
-                        cv2.rectangle(processed_frame, (startX, startY), (endX, endY), color, 3)
-                        y_text = y-20 if y-20 > 10 else y+20
-                        cv2.putText(processed_frame, f"{name} {rec_conf*100:.1f}%", (startX, y_text),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                        recognized_info = info
-                        break
+        def recognize_loop():
+            while True:
+                with self._pending_cv:
+                    self._pending_cv.wait_for(lambda: self._pending is not None)
+                    frame, faces = self._pending
+                    self._pending = None
+
+                recognized_info = None
+                crops, crop_faces = crop_face_regions(frame, faces)
 
-                with self.frame_lock:
-                    self.latest_frame = processed_frame
+                # Every face in the frame goes through the embedder as one batch
+                if crops:
+                    idx, info = self.recognizer.recognize_faces(crops)
+                    if idx is not None:
+                        self._last_recognized = (crop_faces[idx]["box"], info, time.monotonic())
+                        recognized_info = info
 
                 current_time = time.time()
-                if faces and not self.processing and (current_time - self.last_recognition_time > self.recognition_cooldown):
+                if not self.processing and not self._door_busy and (current_time - self.last_recognition_time > self.recognition_cooldown):
                     self.processing = True
                     if recognized_info:
                         self.handle_recognized_person(recognized_info, frame)
@@ -169,25 +239,60 @@ class DeviceServiceLocal:
                         self.handle_unrecognized_person(frame, len(faces))
                     self.last_recognition_time = current_time
                     self.processing = False
-                elif not faces and not self.processing:
-                    if self.system_status != "idle":
-                        self.system_status = "idle"
-                        self._emit_status("idle", "Monitoring for faces", 
-                                        door_locked=(self.local_door_state == "locked"))
-                if self.button.is_pressed():
-                    self.initiate_call_to_owner()
-                    time.sleep(0.5)
 
-                time.sleep(0.05)
+        def encode_loop():
+            while True:
+                with self._encode_cond:
+                    self._encode_cond.wait_for(lambda: self._encode_frame is not None)
+                    frame = self._encode_frame
+                    self._encode_frame = None
+
+                self._publish_jpeg(encode_jpeg(frame, quality=STREAM_JPEG_QUALITY))
 
         thread = threading.Thread(target=loop, daemon=True)
         thread.start()
+        threading.Thread(target=recognize_loop, name="recognize", daemon=True).start()
+        threading.Thread(target=encode_loop, name="mjpeg-encode", daemon=True).start()
+        # Presses arrive as GPIO edge interrupts instead of being polled
+        self.button.on_press(self.initiate_call_to_owner)
+
+    def _publish_jpeg(self, frame_jpeg):
+        """Make frame_jpeg the current stream frame and wake the viewers"""
+        with self.frame_cond:
+            self._latest_part = mjpeg_part(frame_jpeg)
+            self._jpeg_version += 1
+            self.frame_cond.notify_all()
+
+    def _annotate(self, frame, faces):
+        """frame with boxes and the recent recognition drawn on a copy (frame itself if no faces)"""
+        if not faces:
+            return frame
+        # frame is a read-only camera view that uploads still need clean
+        annotated = frame.copy()
+        recent = self._last_recognized
+        if recent and time.monotonic() - recent[2] > RECOGNIZED_OVERLAY_TTL:
+            recent = None
+        for face in faces:
+            draw_face_annotations(annotated, face)
+            # Label the box the worker last recognized (all corners within 20px)
+            if recent and all(abs(a - b) < 20 for a, b in zip(face["box"], recent[0])):
+                draw_face_annotations(annotated, face, recent[1].get("name", "Recognized"),
+                                      recent[1].get("confidence", 0))
+        return annotated
+
+    def _detect(self, frame):
+        """Detect on the camera's half-size stream; boxes come back in frame coordinates"""
+        if not self._motion.changed(frame):
+            return self._last_faces
+        small = self.camera.read_lores()
+        if small is None:
+            return self.face_detector.detect(frame)
+        return self.face_detector.detect(small, frame_size=(frame.shape[1], frame.shape[0]))
 
     def capture_and_upload(self, frame, person_name="Unknown", status="unrecognized"):
         """Capture and upload frame to backend"""
         try:
-            _, buffer = cv2.imencode('.jpg', frame)
-            image_bytes = buffer.tobytes()
+            image_bytes = encode_jpeg(frame, quality=80)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"{person_name}_{status}_{timestamp}.jpg"
 
@@ -202,6 +307,28 @@ class DeviceServiceLocal:
             print("[ERROR] Upload failed:", e)
         return None
 
+    def _submit_upload(self, fn, *args):
+        """Run fn(*args) on the upload pool, or drop it if the backlog is full
+
+        Camera frames are ring-slot views; the slot stays reserved while the
+        job holds it, so no copy is needed.
+        """
+        if not self._upload_slots.acquire(blocking=False):
+            print("[WARN] Upload backlog full, dropping event upload")
+            return
+        future = self._upload_pool.submit(fn, *args)
+        future.add_done_callback(lambda _: self._upload_slots.release())
+
+    def _report_recognized(self, frame, name, conf):
+        image_url = self.capture_and_upload(frame, name, "recognized")
+        if image_url and api_client:
+            api_client.send_notification(
+                status="recognized",
+                image_url=image_url,
+                confidence=conf,
+                person_name=name
+            )
+
     def handle_recognized_person(self, info, frame):
         """Handle authorized person detection"""
         name = info.get("name", "Unknown")
@@ -213,21 +340,15 @@ class DeviceServiceLocal:
         self._emit_status("access_granted", f"Welcome {name}!", 
                          person_name=name, door_locked=False)
         
-        image_url = self.capture_and_upload(frame, name, "recognized")
-        if image_url and api_client:
-            api_client.send_notification(
-                status="recognized",
-                image_url=image_url,
-                confidence=conf,
-                person_name=name
-            )
+        # Encode, upload and notify on the pool so the door reacts immediately
+        self._submit_upload(self._report_recognized, frame, name, conf)
 
         self.relay.open()
         self.local_door_state = "unlocked"
         self.buzzer.beep(100)
-        
-        time.sleep(5)
-        
+        self._schedule_door(5, self._close_door)
+
+    def _close_door(self):
         self.relay.close()
         self.local_door_state = "locked"
         self.system_status = "idle"
@@ -242,10 +363,25 @@ class DeviceServiceLocal:
         
         self._emit_status("access_denied", "Unknown Person Detected", door_locked=True)
         self.buzzer.beep(300)
-        
-        time.sleep(3)
+        self._schedule_door(3, self._end_denied)
+
+    def _end_denied(self):
         self.system_status = "idle"
         self._emit_status("idle", "Monitoring for faces", door_locked=True)
+
+    def _schedule_door(self, delay, callback):
+        """Run callback after delay on a timer; the door counts as busy until then"""
+        self._door_busy = True
+
+        def finish():
+            try:
+                callback()
+            finally:
+                self._door_busy = False
+
+        self._door_timer = threading.Timer(delay, finish)
+        self._door_timer.daemon = True
+        self._door_timer.start()
     
     def on_call_ended(self):
         print("[INFO] Call ended (remote or local)")
@@ -294,19 +430,27 @@ class DeviceServiceLocal:
 
     def mjpeg_frame_generator(self):
         """Generator for MJPEG video stream"""
-        while True:
-            with self.frame_lock:
-                frame = self.latest_frame
-            if frame is not None:
-                _, buffer = cv2.imencode('.jpg', frame)
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-            time.sleep(0.03)
+        with self.frame_cond:
+            self._mjpeg_clients += 1
+            # Frames cached before this viewer joined may be stale
+            last_version = self._jpeg_version
+        try:
+            while True:
+                with self.frame_cond:
+                    if not self.frame_cond.wait_for(lambda: self._jpeg_version > last_version, timeout=1.0):
+                        continue
+                    part = self._latest_part
+                    last_version = self._jpeg_version
+                yield part
+        finally:
+            with self.frame_cond:
+                self._mjpeg_clients -= 1
 
 
 # Initialize service
 service = DeviceServiceLocal(os.getenv("DEVICE_ID"), os.getenv("BACKEND_URL"))
-service.start_camera_loop()
+# Gallery loading runs in the background so Flask binds right away
+threading.Thread(target=service.start_camera_loop, daemon=True).start()
 
 # service = None
 
@@ -339,7 +483,8 @@ def status():
         "status": "running",
         "camera": "active" if service.camera else "inactive",
         "recognizer": "ready" if service.recognizer else "not_ready",
-        "door_state": service.local_door_state
+        "door_state": service.local_door_state,
+        "frames_dropped": service.camera.frames_dropped
     })
 
 @app.route("/api/door/control", methods=["POST"])
@@ -417,22 +562,12 @@ def handle_call_owner():
     service.initiate_call_to_owner()
 
 
-# Add a thread to send periodic keep-alive messages
-def keep_alive_thread():
-    """Send periodic keep-alive messages to all clients"""
-    while True:
-        time.sleep(15)  # Send every 15 seconds
-        socketio.emit('keep_alive', {'timestamp': datetime.now().isoformat()})
-
-# Start the keep-alive thread when app starts
+# Engine.IO's ping/pong (ping_interval above) keeps client connections alive
 if __name__ == "__main__":
     print("[INFO] Starting Smart Doorbell System")
     print("[INFO] Web UI available at http://localhost:5000")
     
     start_chromium()
-    # Start keep-alive thread
-    keep_alive = threading.Thread(target=keep_alive_thread, daemon=True)
-    keep_alive.start()
     
     socketio.run(app, host="0.0.0.0", port=5000, debug=False)
 
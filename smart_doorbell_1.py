@@ -1,17 +1,19 @@
 import eventlet
 eventlet.monkey_patch()
+from eventlet import tpool
 
 import threading
 import time
 import cv2
+import numpy as np
 import os
-from datetime import datetime
 
 from flask import Flask, Response, jsonify, request, render_template
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 
-from camera import Camera
+from camera import Camera, MotionGate
+from jpeg_codec import encode_jpeg, mjpeg_part
 from recognizer import Recognizer
 from hardware import Relay, Buzzer
 from security import decrypt_request
@@ -30,13 +32,22 @@ socketio = SocketIO(
     ping_interval=5
 )
 
+# Kiosk preview stream: half resolution, lower quality, fixed frame rate
+STREAM_SIZE = (320, 240)
+STREAM_QUALITY = 70
+STREAM_FPS = 10
+
+# Status updates are flushed to clients at most this often (seconds); newer
+# ones replace any still waiting
+STATUS_FLUSH_INTERVAL = 0.1
+
 class DeviceServiceLocal:
     def __init__(self, device_id, base_url):
         self.device_id = device_id
         self.base_url = base_url
 
         print("[INFO] Initializing Camera")
-        self.camera = Camera(resolution=(640, 480), framerate=10)
+        self.camera = Camera(resolution=(640, 480), framerate=10, hw_jpeg=True)
 
         print("[INFO] Initializing Face Recognition")
         self.recognizer = Recognizer(threshold=0.6, base_url=base_url)
@@ -51,14 +62,38 @@ class DeviceServiceLocal:
         self.local_door_state = "locked"
         self.processing = False
         self.call_in_progress = False
+        # Door sequences finish on a timer so the frame loop never sleeps;
+        # new events are skipped while one is in progress
+        self._door_timer = None
+        self._door_busy = False
 
         # Timing
         self.last_recognition_time = 0
         self.recognition_cooldown = 3
-
-        # MJPEG
+        # Detection is skipped while the scene is static
+        self._motion = MotionGate(self.camera)
+        self._last_faces = []
+        # Newest status payload not yet sent to the clients
+        self._pending_status = None
+        self._status_cond = threading.Condition()
+        threading.Thread(target=self._status_loop, daemon=True).start()
+
+        # Frame and faces handed from the detect loop to the recognition loop
+        self._pending = None
+        self._pending_cv = threading.Condition()
+
+        # MJPEG: replaced wholesale (never mutated), so readers just take
+        # the reference without a lock. frame_version is bumped under
+        # frame_cond so viewers block until a new frame instead of polling
         self.latest_frame = None
-        self.frame_lock = threading.Lock()
+        self.frame_version = 0
+        self.frame_cond = threading.Condition()
+        # Reused downscale target for the preview stream
+        self._mjpeg_small = np.empty((STREAM_SIZE[1], STREAM_SIZE[0], 3), dtype=np.uint8)
+        # (frame_version, MJPEG part) of the last encoded preview; the first viewer
+        # to want a new version encodes it and the others reuse the bytes
+        self._stream_jpeg = (0, b'')
+        self._stream_lock = threading.Lock()
 
         print("[INFO] Initializing API Client")
         self.api_client = init_api_client(
@@ -72,12 +107,22 @@ class DeviceServiceLocal:
             "state": state,
             "message": message,
             "door_locked": self.local_door_state == "locked",
-            "timestamp": datetime.now().strftime("%H:%M:%S"),
+            "timestamp": time.strftime("%H:%M:%S"),
             **extra
         }
-        socketio.start_background_task(
-            socketio.emit, "status_update", payload
-        )
+        with self._status_cond:
+            self._pending_status = payload
+            self._status_cond.notify()
+
+    def _status_loop(self):
+        """Send the newest status payload, at most once per STATUS_FLUSH_INTERVAL"""
+        while True:
+            with self._status_cond:
+                self._status_cond.wait_for(lambda: self._pending_status is not None)
+                payload = self._pending_status
+                self._pending_status = None
+            socketio.emit("status_update", payload)
+            time.sleep(STATUS_FLUSH_INTERVAL)
 
     def start_camera_loop(self):
         self.camera.start_capture()
@@ -88,44 +133,90 @@ class DeviceServiceLocal:
         self.emit_status("idle", "Monitoring for faces")
 
         def loop():
+            # Publishes every frame to the preview; never waits on the detector
+            frame_id = 0
             while True:
-                frame = self.camera.read()
+                frame, frame_id = self.camera.wait_for_next(frame_id)
                 if frame is None:
-                    time.sleep(0.1)
                     continue
 
-                faces = self.face_detector.detect(frame)
-                processed = frame.copy()
+                with self.frame_cond:
+                    self.latest_frame = frame
+                    self.frame_version += 1
+                    self.frame_cond.notify_all()
 
-                with self.frame_lock:
-                    self.latest_frame = processed
+        def detect_loop():
+            # Always picks up the newest published frame; any that landed
+            # while a detection was running are skipped
+            version = 0
+            while True:
+                with self.frame_cond:
+                    self.frame_cond.wait_for(lambda: self.frame_version > version)
+                    frame, version = self.latest_frame, self.frame_version
 
                 now = time.time()
-
-                if faces and not self.processing and now - self.last_recognition_time > self.recognition_cooldown:
+                ready = (not self.processing and not self._door_busy
+                         and now - self.last_recognition_time > self.recognition_cooldown)
+
+                # The preview isn't annotated, so while nothing could be
+                # triggered the detector doesn't run at all; the first frame
+                # afterwards gets a full scan
+                if not ready:
+                    self._last_faces = []
+                    self._motion.reset()
+                # The camera is read here on the green thread; only the
+                # DNN call itself runs on a native thread so the eventlet hub
+                # keeps serving the stream and socket.io meanwhile
+                elif self._motion.changed(frame):
+                    small = self.camera.read_lores()
+                    self._last_faces = tpool.execute(self._detect, frame, small)
+                faces = self._last_faces
+
+                if faces and ready:
                     self.processing = True
                     self.last_recognition_time = now
 
                     self.emit_status("detecting", "Face detected")
 
-                    face = faces[0]
+                    # Recognition gets its own stage; detection carries on
+                    with self._pending_cv:
+                        self._pending = (frame, faces)
+                        self._pending_cv.notify()
+
+        def recognize_loop():
+            while True:
+                with self._pending_cv:
+                    self._pending_cv.wait_for(lambda: self._pending is not None)
+                    frame, faces = self._pending
+                    self._pending = None
+
+                # Every face in the frame goes through the embedder as one batch
+                crops = []
+                for face in faces:
                     x1, y1, x2, y2 = face["box"]
                     face_img = frame[y1:y2, x1:x2]
-
                     if face_img.size > 0:
-                        face_img = cv2.resize(face_img, (160, 160))
-                        recognized, info = self.recognizer.recognize_face(face_img)
+                        crops.append(face_img)
 
-                        if recognized:
-                            self.handle_recognized(info, frame)
-                        else:
-                            self.handle_unrecognized(frame)
+                if crops:
+                    idx, info = tpool.execute(self.recognizer.recognize_faces, crops)
 
-                    self.processing = False
+                    if idx is not None:
+                        self.handle_recognized(info, frame)
+                    else:
+                        self.handle_unrecognized(frame)
 
-                time.sleep(0.1)
+                self.processing = False
 
         threading.Thread(target=loop, daemon=True).start()
+        threading.Thread(target=detect_loop, daemon=True).start()
+        threading.Thread(target=recognize_loop, daemon=True).start()
+
+    def _detect(self, frame, small):
+        """Detect on the camera's half-size frame; boxes come back in frame coordinates"""
+        if small is None:
+            return self.face_detector.detect(frame)
+        return self.face_detector.detect(small, frame_size=(frame.shape[1], frame.shape[0]))
 
     def handle_recognized(self, info, frame):
         name = info.get("name", "Authorized")
@@ -139,8 +230,9 @@ class DeviceServiceLocal:
         self.local_door_state = "unlocked"
         self.buzzer.beep(100)
 
-        time.sleep(5)
+        self._schedule_door(5, self._close_door)
 
+    def _close_door(self):
         self.relay.close()
         self.local_door_state = "locked"
 
@@ -153,9 +245,21 @@ class DeviceServiceLocal:
 
         self.buzzer.beep(300)
 
-        time.sleep(3)
+        self._schedule_door(3, lambda: self.emit_status("idle", "Monitoring for faces"))
 
-        self.emit_status("idle", "Monitoring for faces")
+    def _schedule_door(self, delay, callback):
+        """Run callback after delay on a timer; the door counts as busy until then"""
+        self._door_busy = True
+
+        def finish():
+            try:
+                callback()
+            finally:
+                self._door_busy = False
+
+        self._door_timer = threading.Timer(delay, finish)
+        self._door_timer.daemon = True
+        self._door_timer.start()
 
     def initiate_call(self):
         if self.call_in_progress:
@@ -173,22 +277,43 @@ class DeviceServiceLocal:
         self.call_in_progress = False
         self.emit_status("idle", "Monitoring for faces")
 
+    def _preview_part(self, frame, version):
+        """MJPEG part for a downscaled frame, encoded at most once per frame version"""
+        with self._stream_lock:
+            if self._stream_jpeg[0] != version:
+                # The ISP's hardware JPEG costs no CPU; the kiosk is local, so
+                # its full size doesn't matter. Software path only without it
+                jpeg = self.camera.read_jpeg()
+                if jpeg is None:
+                    cv2.resize(frame, STREAM_SIZE, dst=self._mjpeg_small,
+                               interpolation=cv2.INTER_AREA)
+                    jpeg = encode_jpeg(self._mjpeg_small, quality=STREAM_QUALITY)
+                self._stream_jpeg = (version, mjpeg_part(jpeg))
+            return self._stream_jpeg[1]
+
     def mjpeg_stream(self):
+        interval = 1.0 / STREAM_FPS
+        next_time = time.monotonic()
+        last_version = 0
         try:
             while True:
-                with self.frame_lock:
-                    frame = self.latest_frame
+                with self.frame_cond:
+                    if self.frame_cond.wait_for(lambda: self.frame_version != last_version, timeout=1.0):
+                        frame = self.latest_frame
+                        last_version = self.frame_version
+                    else:
+                        frame = None
 
                 if frame is not None:
-                    _, buffer = cv2.imencode(".jpg", frame)
-                    yield (
-                        b"--frame\r\n"
-                        b"Content-Type: image/jpeg\r\n\r\n" +
-                        buffer.tobytes() +
-                        b"\r\n"
-                    )
-
-                time.sleep(0.05)
+                    yield self._preview_part(frame, last_version)
+
+                # Pace against a fixed schedule so encode time doesn't add drift
+                next_time += interval
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_time = time.monotonic()
         except GeneratorExit:
             print("[INFO] MJPEG client disconnected")
 
@@ -218,7 +343,8 @@ def video_feed():
 def api_status():
     return jsonify({
         "status": "running",
-        "door_state": service.local_door_state
+        "door_state": service.local_door_state,
+        "frames_dropped": service.camera.frames_dropped
     })
 
 @app.route("/api/call", methods=["POST"])
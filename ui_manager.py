@@ -5,9 +5,28 @@ os.environ["SDL_VIDEODRIVER"] = "fbcon"
 os.environ["SDL_FBDEV"] = "/dev/fb1"
 os.environ["SDL_NOMOUSE"] = "1"
 
+import functools
+import numpy as np
 import pygame
 import time
-from datetime import datetime
+from collections import OrderedDict
+
+# Rendered text surfaces kept for reuse; labels, names and the clock fit easily
+TEXT_CACHE_SIZE = 256
+
+# States whose frames change on their own (loading bar, pulsing circles);
+# every other state is only redrawn when it changes or the clock ticks over
+ANIMATED_STATES = {"loading", "detecting", "calling"}
+
+# Animations repeat every ANIMATION_PERIOD frames; per-frame pulse radius
+# offsets (0..50..0) and loading bar fill fractions, looked up by frame
+ANIMATION_PERIOD = 100
+PULSE_OFFSETS = tuple(abs((i * 2) % 100 - 50) for i in range(ANIMATION_PERIOD))
+BAR_PROGRESS = tuple(i / ANIMATION_PERIOD for i in range(ANIMATION_PERIOD))
+
+# Frame rate for animated screens, and for polling touches on static ones
+ANIMATED_FPS = 30
+IDLE_FPS = 10
 
 class UIManager:
     """
@@ -31,13 +50,20 @@ class UIManager:
         
         pygame.init()
         #pygame.display.init()
+        # update() only acts on these; nothing else is queued at all
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN])
         
         # Display configuration for 3.5" RPi Display (480x320)
         self.width = 480
         self.height = 320
-        self.screen = pygame.display.set_mode((self.width, self.height))
-        pygame.mouse.set_visible(True)
-        pygame.display.set_caption("Smart Doorbell")
+        # Fullscreen hardware surface straight on the framebuffer. Not
+        # DOUBLEBUF: animated frames push only their changed rect, which a
+        # page-flipped display would lose
+        self.screen = pygame.display.set_mode((self.width, self.height),
+                                              pygame.FULLSCREEN | pygame.HWSURFACE)
+        # Touch-only panel: no cursor is shown (SDL_NOMOUSE) and a
+        # framebuffer has no window to caption
         
         # Color scheme
         self.PRIMARY = self._hex_to_rgb(primary_color)
@@ -60,24 +86,75 @@ class UIManager:
         self.font_tiny = pygame.font.Font(None, 18)
         
         # State
-        self.current_state = "loading"
-        self.state_data = {}
-        self._call_button_rect = None
+        # (state name, state data), replaced whole by the setters so update()
+        # never sees a new state with the previous state's data
+        self._screen = ("loading", {})
+        # Set by the state setters; the screen is left alone until then
+        self._dirty = True
+        self._drawn_minute = None
+        self._clock_str = ""
+        self._date_str = ""
         self.clock = pygame.time.Clock()
         
+        # Render function for each state name
+        self._renderers = {
+            "loading": self._render_loading,
+            "idle": self._render_idle,
+            "detecting": self._render_detecting,
+            "access_granted": self._render_access_granted,
+            "access_denied": self._render_access_denied,
+            "calling": self._render_calling,
+            "status": self._render_status,
+        }
+        
+        # Fixed layout, built once rather than on every redraw
+        self._header_rect = pygame.Rect(0, 0, self.width, 70)
+        self._call_rect_right = pygame.Rect(self.width - 160, self.height - 60, 140, 45)
+        self._call_rect_center = pygame.Rect(self.width // 2 - 70, self.height - 60, 140, 45)
+        # Where the Call Owner button is on each screen that shows one
+        self._call_button_rects = {
+            "idle": self._call_rect_right,
+            "detecting": self._call_rect_right,
+            "access_denied": self._call_rect_center,
+        }
+        
         # Animation
         self.animation_time = 0
+        # The only part of each animated screen that changes between frames
+        # (loading bar, pulse circles at their largest radius); everything
+        # else is pushed to the display only on a full redraw
+        cx = self.width // 2
+        self._animated_rects = {
+            "loading": pygame.Rect((self.width - 300) // 2, 220, 300, 8),
+            "detecting": pygame.Rect(cx - 80, 160 - 80, 160, 160),
+            "calling": pygame.Rect(cx - 90, 140 - 90, 180, 180),
+        }
+        
+        # Gradient backgrounds by (color1, color2); only a handful are ever used
+        self._gradients = {}
+        # Pre-rendered icons (transparent surfaces) by shape and parameters
+        self._icons = {}
+        
+        # Rendered text surfaces by (font, text, color), least recently used first
+        self._text_cache = OrderedDict()
+        # Top-left blit positions of centered text by (font, text, center)
+        self._text_positions = {}
     
     def _hex_to_rgb(self, hex_color):
         """Convert hex color to RGB tuple"""
         hex_color = hex_color.lstrip('#')
         return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
     
-    def _darken_color(self, color, factor):
+    # Only a handful of (color, factor) pairs are ever used, several per frame
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _darken_color(color, factor):
         """Darken a color by a factor (0-1)"""
         return tuple(int(c * (1 - factor)) for c in color)
     
-    def _lighten_color(self, color, factor):
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _lighten_color(color, factor):
         """Lighten a color by a factor (0-1)"""
         return tuple(min(255, int(c + (255 - c) * factor)) for c in color)
     
@@ -88,6 +165,10 @@ class UIManager:
         """
         self.animation_time += 1
         call_pressed = False
+        # Cleared before taking the snapshot: a setter racing with this
+        # frame marks the UI dirty again and is drawn on the next one
+        dirty, self._dirty = self._dirty, False
+        state, data = self._screen
         
         # Handle events
         for event in pygame.event.get():
@@ -95,159 +176,230 @@ class UIManager:
                 pygame.quit()
                 return None
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if self._call_button_rect and self._call_button_rect.collidepoint(event.pos):
+                rect = self._call_button_rects.get(state)
+                if rect and rect.collidepoint(event.pos):
                     call_pressed = True
                     print("[UI] Call button pressed")
         
+        # Static screens are only redrawn on a state change or a new minute
+        minute = int(time.time() // 60)
+        animated = state in ANIMATED_STATES
+        full_redraw = dirty or minute != self._drawn_minute
+        if not (full_redraw or animated):
+            self.clock.tick(IDLE_FPS)
+            return call_pressed
+        if minute != self._drawn_minute:
+            # Formatted once per minute rather than on every redraw
+            self._drawn_minute = minute
+            self._clock_str = time.strftime("%H:%M")
+            self._date_str = time.strftime("%B %d, %Y")
+        
         # Render current state
-        if self.current_state == "loading":
-            self._render_loading()
-        elif self.current_state == "idle":
-            self._render_idle()
-        elif self.current_state == "detecting":
-            self._render_detecting()
-        elif self.current_state == "access_granted":
-            self._render_access_granted()
-        elif self.current_state == "access_denied":
-            self._render_access_denied()
-        elif self.current_state == "calling":
-            self._render_calling()
-        elif self.current_state == "status":
-            self._render_status()
-        
-        pygame.display.flip()
-        self.clock.tick(30)  # 30 FPS
+        renderer = self._renderers.get(state)
+        if renderer is not None:
+            renderer(data)
+        
+        if full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self._animated_rects[state])
+        self.clock.tick(ANIMATED_FPS if animated else IDLE_FPS)
         
         return call_pressed
     
+    @property
+    def current_state(self):
+        """Name of the screen being shown"""
+        return self._screen[0]
+    
+    @property
+    def state_data(self):
+        """Data the current screen was shown with (treat as read-only)"""
+        return self._screen[1]
+    
     # ----------------------------
     # State Setters (Thread-safe)
     # ----------------------------
     def show_loading(self, title, message):
         """Display loading screen with progress"""
-        self.current_state = "loading"
-        self.state_data = {"title": title, "message": message}
+        self._screen = ("loading", {"title": title, "message": message})
+        self._dirty = True
     
     def update_loading(self, message, progress=None):
         """Update loading screen message"""
-        self.state_data["message"] = message
+        state, data = self._screen
+        data = dict(data, message=message)
         if progress is not None:
-            self.state_data["progress"] = progress
+            data["progress"] = progress
+        self._screen = (state, data)
+        self._dirty = True
     
     def show_idle(self, door_locked=True):
         """Display idle/ready state"""
-        self.current_state = "idle"
-        self.state_data = {"door_locked": door_locked}
+        self._screen = ("idle", {"door_locked": door_locked})
+        self._dirty = True
     
     def show_detecting(self):
         """Display face detection in progress"""
-        self.current_state = "detecting"
-        self.state_data = {}
+        self._screen = ("detecting", {})
+        self._dirty = True
     
     def show_access_granted(self, person_name):
         """Display access granted screen"""
-        self.current_state = "access_granted"
-        self.state_data = {"person_name": person_name}
+        self._screen = ("access_granted", {"person_name": person_name})
+        self._dirty = True
     
     def show_access_denied(self):
         """Display access denied screen"""
-        self.current_state = "access_denied"
-        self.state_data = {}
+        self._screen = ("access_denied", {})
+        self._dirty = True
     
     def show_calling(self):
         """Display calling owner screen"""
-        self.current_state = "calling"
-        self.state_data = {}
+        self._screen = ("calling", {})
+        self._dirty = True
     
     def show_status(self, status_type, message):
         """Display a general status message"""
-        self.current_state = "status"
-        self.state_data = {"status_type": status_type, "message": message}
+        self._screen = ("status", {"status_type": status_type, "message": message})
+        self._dirty = True
     
     # ----------------------------
     # Drawing Utilities
     # ----------------------------
     def _draw_gradient_background(self, color1, color2):
         """Draw a vertical gradient background"""
-        for y in range(self.height):
-            ratio = y / self.height
-            color = tuple(
-                int(color1[i] * (1 - ratio) + color2[i] * ratio)
-                for i in range(3)
-            )
-            pygame.draw.line(self.screen, color, (0, y), (self.width, y))
+        key = (color1, color2)
+        surface = self._gradients.get(key)
+        if surface is None:
+            # Built once per color pair, then just blitted. Row y blends
+            # color1 -> color2 by y / height; surfarray is indexed [x, y]
+            rows = np.linspace(color1, color2, self.height, endpoint=False).astype(np.uint8)
+            pixels = np.repeat(rows[np.newaxis], self.width, axis=0)
+            surface = pygame.surfarray.make_surface(pixels).convert()
+            self._gradients[key] = surface
+        self.screen.blit(surface, (0, 0))
+    
+    def _text(self, font, text, color):
+        """font.render(text, True, color), cached since most labels never change"""
+        key = (id(font), text, color)
+        surface = self._text_cache.get(key)
+        if surface is None:
+            # Display pixel format, so blits don't convert every frame
+            surface = font.render(text, True, color).convert_alpha()
+            self._text_cache[key] = surface
+            if len(self._text_cache) > TEXT_CACHE_SIZE:
+                self._text_cache.popitem(last=False)
+        else:
+            self._text_cache.move_to_end(key)
+        return surface
+    
+    def _blit_text(self, font, text, color, center):
+        """Blit cached text centered on center; the top-left is worked out once"""
+        surface = self._text(font, text, color)
+        key = (id(font), text, center)
+        pos = self._text_positions.get(key)
+        if pos is None:
+            if len(self._text_positions) >= TEXT_CACHE_SIZE:
+                self._text_positions.clear()
+            w, h = surface.get_size()
+            pos = self._text_positions[key] = (center[0] - w // 2, center[1] - h // 2)
+        self.screen.blit(surface, pos)
     
     def _draw_header(self, title, subtitle=""):
         """Draw header section with title and subtitle"""
-        pygame.draw.rect(self.screen, self.PRIMARY, (0, 0, self.width, 70))
+        pygame.draw.rect(self.screen, self.PRIMARY, self._header_rect)
         
-        title_text = self.font_medium.render(title, True, self.WHITE)
-        title_rect = title_text.get_rect(center=(self.width // 2, 25))
-        self.screen.blit(title_text, title_rect)
+        self._blit_text(self.font_medium, title, self.WHITE, (self.width // 2, 25))
         
         if subtitle:
-            subtitle_text = self.font_tiny.render(subtitle, True, self.PRIMARY_LIGHT)
-            subtitle_rect = subtitle_text.get_rect(center=(self.width // 2, 50))
-            self.screen.blit(subtitle_text, subtitle_rect)
+            self._blit_text(self.font_tiny, subtitle, self.PRIMARY_LIGHT, (self.width // 2, 50))
     
-    def _draw_status_indicator(self, x, y, color, label):
-        """Draw a small status indicator circle with label"""
-        pygame.draw.circle(self.screen, color, (x, y), 8)
-        pygame.draw.circle(self.screen, self.WHITE, (x, y), 8, 2)
-        
-        label_text = self.font_tiny.render(label, True, self.WHITE)
+    def _draw_status_indicator(self, x, y, color, label, surface=None):
+        """Draw a small status indicator circle with label (on the screen by default)"""
+        if surface is None:
+            surface = self.screen
+        pygame.draw.circle(surface, color, (x, y), 8)
+        pygame.draw.circle(surface, self.WHITE, (x, y), 8, 2)
+        
+        label_text = self._text(self.font_tiny, label, self.WHITE)
         label_rect = label_text.get_rect(midleft=(x + 15, y))
-        self.screen.blit(label_text, label_rect)
+        surface.blit(label_text, label_rect)
     
-    def _draw_button(self, x, y, width, height, text, color, text_color=None):
-        """Draw a rounded button and return its rect"""
+    def _draw_button(self, rect, text, color, text_color=None):
+        """Draw a rounded button in rect"""
         if text_color is None:
             text_color = self.WHITE
         
-        rect = pygame.Rect(x, y, width, height)
         pygame.draw.rect(self.screen, color, rect, border_radius=10)
         pygame.draw.rect(self.screen, self._darken_color(color, 0.2), rect, 3, border_radius=10)
         
-        button_text = self.font_small.render(text, True, text_color)
-        text_rect = button_text.get_rect(center=rect.center)
-        self.screen.blit(button_text, text_rect)
-        
-        return rect
+        self._blit_text(self.font_small, text, text_color, rect.center)
+    
+    def _icon(self, key, size, draw):
+        """Transparent surface of the given size, drawn once by draw(surface)"""
+        surface = self._icons.get(key)
+        if surface is None:
+            surface = pygame.Surface(size, pygame.SRCALPHA).convert_alpha()
+            draw(surface)
+            self._icons[key] = surface
+        return surface
     
     def _draw_icon_lock(self, x, y, size, locked=True):
         """Draw a lock icon"""
         color = self.RED if locked else self.GREEN
-        
-        body_rect = pygame.Rect(x - size//3, y, size//1.5, size//1.5)
-        pygame.draw.rect(self.screen, color, body_rect, border_radius=5)
-        
-        if locked:
-            pygame.draw.arc(self.screen, color, 
-                          (x - size//4, y - size//2, size//2, size//2), 
-                          0, 3.14, 5)
+        # Drawn around (c, c) on the icon surface, which lands at (x, y)
+        c = size // 2
+        
+        def draw(surface):
+            body_rect = pygame.Rect(c - size//3, c, size//1.5, size//1.5)
+            pygame.draw.rect(surface, color, body_rect, border_radius=5)
+            
+            if locked:
+                pygame.draw.arc(surface, color, 
+                              (c - size//4, c - size//2, size//2, size//2), 
+                              0, 3.14, 5)
+        
+        icon = self._icon(("lock", size, locked), (size, c + int(size//1.5)), draw)
+        self.screen.blit(icon, (x - c, y - c))
+    
+    def _draw_icon_check(self, x, y, color):
+        """Draw a check mark in a ring centered on (x, y)"""
+        def draw(surface):
+            pygame.draw.circle(surface, color, (60, 60), 50, 6)
+            points = [(40, 60), (55, 75), (85, 35)]
+            pygame.draw.lines(surface, color, False, points, 8)
+        
+        self.screen.blit(self._icon(("check", color), (120, 120), draw), (x - 60, y - 60))
+    
+    def _draw_icon_cross(self, x, y, color):
+        """Draw a cross in a ring centered on (x, y)"""
+        def draw(surface):
+            offset = 30
+            pygame.draw.circle(surface, color, (60, 60), 50, 6)
+            pygame.draw.line(surface, color,
+                           (60 - offset, 60 - offset), (60 + offset, 60 + offset), 8)
+            pygame.draw.line(surface, color,
+                           (60 + offset, 60 - offset), (60 - offset, 60 + offset), 8)
+        
+        self.screen.blit(self._icon(("cross", color), (120, 120), draw), (x - 60, y - 60))
     
     def _draw_clock(self):
         """Draw current time in top right"""
-        now = datetime.now()
-        time_str = now.strftime("%H:%M")
-        time_text = self.font_small.render(time_str, True, self.WHITE)
+        time_text = self._text(self.font_small, self._clock_str, self.WHITE)
         self.screen.blit(time_text, (self.width - 80, 10))
     
     # ----------------------------
     # Render Functions
     # ----------------------------
-    def _render_loading(self):
+    def _render_loading(self, data):
         """Render loading screen"""
         self._draw_gradient_background(self.PRIMARY_DARK, self.PRIMARY)
         
-        title_text = self.font_large.render("DOORBELL", True, self.WHITE)
-        title_rect = title_text.get_rect(center=(self.width // 2, 80))
-        self.screen.blit(title_text, title_rect)
+        self._blit_text(self.font_large, "DOORBELL", self.WHITE, (self.width // 2, 80))
         
-        message = self.state_data.get("message", "Loading...")
-        msg_text = self.font_small.render(message, True, self.PRIMARY_LIGHT)
-        msg_rect = msg_text.get_rect(center=(self.width // 2, 180))
-        self.screen.blit(msg_text, msg_rect)
+        message = data.get("message", "Loading...")
+        self._blit_text(self.font_small, message, self.PRIMARY_LIGHT, (self.width // 2, 180))
         
         # Animated loading bar
         bar_width = 300
@@ -258,61 +410,55 @@ class UIManager:
         pygame.draw.rect(self.screen, self.DARK_GRAY, 
                        (bar_x, bar_y, bar_width, bar_height), border_radius=4)
         
-        progress = (self.animation_time % 100) / 100
+        progress = BAR_PROGRESS[self.animation_time % ANIMATION_PERIOD]
         progress_width = int(bar_width * progress)
         pygame.draw.rect(self.screen, self.WHITE, 
                        (bar_x, bar_y, progress_width, bar_height), border_radius=4)
     
-    def _render_idle(self):
+    def _render_idle(self, data):
         """Render idle/ready state"""
         self.screen.fill(self.DARK_GRAY)
-        self._draw_header("Smart Doorbell", datetime.now().strftime("%B %d, %Y"))
+        self._draw_header("Smart Doorbell", self._date_str)
         self._draw_clock()
         
         center_y = 160
-        door_locked = self.state_data.get("door_locked", True)
+        door_locked = data.get("door_locked", True)
         
         self._draw_icon_lock(self.width // 2, center_y - 40, 60, locked=door_locked)
         
         status_text = "Door Locked" if door_locked else "Door Unlocked"
         status_color = self.RED if door_locked else self.GREEN
-        text = self.font_medium.render(status_text, True, status_color)
-        text_rect = text.get_rect(center=(self.width // 2, center_y + 30))
-        self.screen.blit(text, text_rect)
+        self._blit_text(self.font_medium, status_text, status_color, (self.width // 2, center_y + 30))
         
-        ready_text = self.font_small.render("Ready - Monitoring for faces", True, self.LIGHT_GRAY)
-        ready_rect = ready_text.get_rect(center=(self.width // 2, center_y + 65))
-        self.screen.blit(ready_text, ready_rect)
+        self._blit_text(self.font_small, "Ready - Monitoring for faces", self.LIGHT_GRAY, (self.width // 2, center_y + 65))
         
-        self._call_button_rect = self._draw_button(
-            self.width - 160, self.height - 60, 140, 45,
-            "Call Owner", self.BLUE
-        )
+        self._draw_button(self._call_rect_right, "Call Owner", self.BLUE)
         
-        self._draw_status_indicator(20, self.height - 30, self.GREEN, "Camera Active")
-        self._draw_status_indicator(20, self.height - 55, self.GREEN, "System Online")
+        # Both indicators are drawn once into a footer surface, which covers
+        # the bottom-left 240x70 of the screen
+        def draw_footer(surface):
+            self._draw_status_indicator(20, 40, self.GREEN, "Camera Active", surface)
+            self._draw_status_indicator(20, 15, self.GREEN, "System Online", surface)
+        
+        footer = self._icon(("idle_footer",), (240, 70), draw_footer)
+        self.screen.blit(footer, (0, self.height - 70))
     
-    def _render_detecting(self):
+    def _render_detecting(self, data):
         """Render face detection screen"""
         self.screen.fill(self.DARK_GRAY)
         self._draw_header("Face Detected", "Analyzing...")
         self._draw_clock()
         
         center_y = 160
-        pulse = abs((self.animation_time * 2) % 100 - 50) + 30
+        pulse = PULSE_OFFSETS[self.animation_time % ANIMATION_PERIOD] + 30
         pygame.draw.circle(self.screen, self.YELLOW, 
                          (self.width // 2, center_y), pulse, 3)
         
-        text = self.font_medium.render("Identifying...", True, self.YELLOW)
-        text_rect = text.get_rect(center=(self.width // 2, center_y + 60))
-        self.screen.blit(text, text_rect)
+        self._blit_text(self.font_medium, "Identifying...", self.YELLOW, (self.width // 2, center_y + 60))
         
-        self._call_button_rect = self._draw_button(
-            self.width - 160, self.height - 60, 140, 45,
-            "Call Owner", self.BLUE
-        )
+        self._draw_button(self._call_rect_right, "Call Owner", self.BLUE)
     
-    def _render_access_granted(self):
+    def _render_access_granted(self, data):
         """Render access granted screen"""
         self._draw_gradient_background(self.GREEN, self._darken_color(self.GREEN, 0.3))
         self._draw_header("Access Granted", "Welcome!")
@@ -320,25 +466,14 @@ class UIManager:
         
         center_y = 160
         
-        pygame.draw.circle(self.screen, self.WHITE, 
-                         (self.width // 2, center_y - 20), 50, 6)
-        points = [
-            (self.width // 2 - 20, center_y - 20),
-            (self.width // 2 - 5, center_y - 5),
-            (self.width // 2 + 25, center_y - 45)
-        ]
-        pygame.draw.lines(self.screen, self.WHITE, False, points, 8)
-        
-        person_name = self.state_data.get("person_name", "User")
-        name_text = self.font_large.render(person_name, True, self.WHITE)
-        name_rect = name_text.get_rect(center=(self.width // 2, center_y + 50))
-        self.screen.blit(name_text, name_rect)
-        
-        status_text = self.font_small.render("Door Unlocking...", True, self.WHITE)
-        status_rect = status_text.get_rect(center=(self.width // 2, center_y + 85))
-        self.screen.blit(status_text, status_rect)
-    
-    def _render_access_denied(self):
+        self._draw_icon_check(self.width // 2, center_y - 20, self.WHITE)
+        
+        person_name = data.get("person_name", "User")
+        self._blit_text(self.font_large, person_name, self.WHITE, (self.width // 2, center_y + 50))
+        
+        self._blit_text(self.font_small, "Door Unlocking...", self.WHITE, (self.width // 2, center_y + 85))
+    
+    def _render_access_denied(self, data):
         """Render access denied screen"""
         self._draw_gradient_background(self.RED, self._darken_color(self.RED, 0.3))
         self._draw_header("Access Denied", "Unknown Person")
@@ -346,53 +481,34 @@ class UIManager:
         
         center_y = 160
         
-        pygame.draw.circle(self.screen, self.WHITE, 
-                         (self.width // 2, center_y - 20), 50, 6)
-        offset = 30
-        pygame.draw.line(self.screen, self.WHITE,
-                       (self.width // 2 - offset, center_y - 20 - offset),
-                       (self.width // 2 + offset, center_y - 20 + offset), 8)
-        pygame.draw.line(self.screen, self.WHITE,
-                       (self.width // 2 + offset, center_y - 20 - offset),
-                       (self.width // 2 - offset, center_y - 20 + offset), 8)
-        
-        warning_text = self.font_medium.render("Unknown Person", True, self.WHITE)
-        warning_rect = warning_text.get_rect(center=(self.width // 2, center_y + 50))
-        self.screen.blit(warning_text, warning_rect)
-        
-        status_text = self.font_small.render("Access Denied - Door Locked", True, self.WHITE)
-        status_rect = status_text.get_rect(center=(self.width // 2, center_y + 85))
-        self.screen.blit(status_text, status_rect)
-        
-        self._call_button_rect = self._draw_button(
-            self.width // 2 - 70, self.height - 60, 140, 45,
-            "Call Owner", self.WHITE, self.RED
-        )
-    
-    def _render_calling(self):
+        self._draw_icon_cross(self.width // 2, center_y - 20, self.WHITE)
+        
+        self._blit_text(self.font_medium, "Unknown Person", self.WHITE, (self.width // 2, center_y + 50))
+        
+        self._blit_text(self.font_small, "Access Denied - Door Locked", self.WHITE, (self.width // 2, center_y + 85))
+        
+        self._draw_button(self._call_rect_center, "Call Owner", self.WHITE, self.RED)
+    
+    def _render_calling(self, data):
         """Render calling screen"""
         self._draw_gradient_background(self.BLUE, self._darken_color(self.BLUE, 0.3))
         self._draw_header("Calling Owner", "Please wait...")
         self._draw_clock()
         
         center_y = 160
-        pulse = abs((self.animation_time * 2) % 100 - 50) + 40
+        pulse = PULSE_OFFSETS[self.animation_time % ANIMATION_PERIOD] + 40
         pygame.draw.circle(self.screen, self.WHITE, 
                          (self.width // 2, center_y - 20), pulse, 5)
         
         # Draw phone icon using text
-        phone_text = self.font_large.render("CALL", True, self.WHITE)
-        phone_rect = phone_text.get_rect(center=(self.width // 2, center_y - 20))
-        self.screen.blit(phone_text, phone_rect)
+        self._blit_text(self.font_large, "CALL", self.WHITE, (self.width // 2, center_y - 20))
         
-        status_text = self.font_medium.render("Connecting...", True, self.WHITE)
-        status_rect = status_text.get_rect(center=(self.width // 2, center_y + 50))
-        self.screen.blit(status_text, status_rect)
+        self._blit_text(self.font_medium, "Connecting...", self.WHITE, (self.width // 2, center_y + 50))
     
-    def _render_status(self):
+    def _render_status(self, data):
         """Render generic status screen"""
-        status_type = self.state_data.get("status_type", "loading")
-        message = self.state_data.get("message", "")
+        status_type = data.get("status_type", "loading")
+        message = data.get("message", "")
         
         color_map = {
             "loading": self.BLUE,
@@ -408,6 +524,4 @@ class UIManager:
         self._draw_header("Status", "")
         self._draw_clock()
         
-        msg_text = self.font_medium.render(message, True, self.WHITE)
-        msg_rect = msg_text.get_rect(center=(self.width // 2, 160))
-        self.screen.blit(msg_text, msg_rect)
\ No newline at end of file
+        self._blit_text(self.font_medium, message, self.WHITE, (self.width // 2, 160))
\ No newline at end of file